@@ -1,54 +1,269 @@
+import asyncio
+import hashlib
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from datetime import datetime, timedelta
 from typing import Annotated, Optional
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from jose import JWTError, jwt
-from passlib.context import CryptContext
+from jose import JWTError
+from pydantic import BaseModel
 from decouple import config
 from sqlmodel import Session, select
-from database import get_session
-from models import User
+from sqlmodel.ext.asyncio.session import AsyncSession
+from database import get_async_session
+from models import User, Role
+from cache import TTLCache
+from services.token_revocation import revocation_store
+import metrics
 
 # Configuration
 SECRET_KEY = config("SECRET_KEY", default="09d25e094faa6ca2556c818166b7a9563b93f7099f6f0f4caa6cf63b88e8d3e7")
 ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 30
+# Access tokens are short-lived; clients renew them with a rotating refresh token
+# instead of sending the password again.
+ACCESS_TOKEN_EXPIRE_MINUTES = config("ACCESS_TOKEN_EXPIRE_MINUTES", default=15, cast=int)
+REFRESH_TOKEN_EXPIRE_DAYS = config("REFRESH_TOKEN_EXPIRE_DAYS", default=7, cast=int)
+
+# Password hashing runs in its own small pool so a login storm only queues
+# behind other hashes instead of blocking the event loop for every request.
+PASSWORD_HASH_WORKERS = config("PASSWORD_HASH_WORKERS", default=2, cast=int)
+PASSWORD_HASH_MAX_PENDING = config("PASSWORD_HASH_MAX_PENDING", default=64, cast=int)
+
+# Authenticated users are cached by token subject so most requests skip the user lookup.
+# Admin changes invalidate the entry on this worker; the TTL bounds staleness on others.
+PRINCIPAL_CACHE_SIZE = config("PRINCIPAL_CACHE_SIZE", default=10000, cast=int)
+PRINCIPAL_CACHE_TTL_SECONDS = config("PRINCIPAL_CACHE_TTL_SECONDS", default=60, cast=float)
+
+# Claims-only auth re-checks each user's principal stamp at most this often,
+# so deactivation or a password reset takes effect within this window.
+PRINCIPAL_STAMP_TTL_SECONDS = config("PRINCIPAL_STAMP_TTL_SECONDS", default=15, cast=float)
+
+# Already-verified tokens (keyed by digest, never the raw token) map to their claims until exp
+TOKEN_CACHE_SIZE = config("TOKEN_CACHE_SIZE", default=10000, cast=int)
+
+# pbkdf2 cost. Size it with bench_password_hash.py against a login latency budget.
+# Stored hashes with a different cost are rehashed on the next successful login.
+PASSWORD_HASH_ROUNDS = config("PASSWORD_HASH_ROUNDS", default=29000, cast=int)
+
+# passlib and jose.jwt (which loads the cryptography backend) are imported on
+# first use rather than at startup, to keep worker boot fast.
+@lru_cache(maxsize=None)
+def get_pwd_context():
+    from passlib.context import CryptContext
+    return CryptContext(
+        schemes=["pbkdf2_sha256"],
+        deprecated="auto",
+        pbkdf2_sha256__rounds=PASSWORD_HASH_ROUNDS,
+    )
+
+def _jwt():
+    from jose import jwt
+    return jwt
 
-pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token")
 
+_hash_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="pwhash")
+_hash_pending = 0
+principal_cache = TTLCache("principal", maxsize=PRINCIPAL_CACHE_SIZE, ttl=PRINCIPAL_CACHE_TTL_SECONDS)
+token_cache = TTLCache("token", maxsize=TOKEN_CACHE_SIZE, ttl=ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+stamp_cache = TTLCache("principal_stamp", maxsize=PRINCIPAL_CACHE_SIZE, ttl=PRINCIPAL_STAMP_TTL_SECONDS)
+
+class Principal(BaseModel):
+    """Caller identity taken from signed token claims, without loading the User row"""
+    id: int
+    email: str
+    role: Role
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    return get_pwd_context().verify(plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+    return get_pwd_context().hash(password)
 
-def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
+def verify_and_update_password(plain_password: str, hashed_password: str):
+    """Verify a password and, if the stored hash uses outdated settings, return a replacement.
+
+    Returns (is_valid, new_hash_or_None).
+    """
+    return get_pwd_context().verify_and_update(plain_password, hashed_password)
+
+def _report_hash_pending():
+    metrics.set_gauge("auth.hash_in_flight", _hash_pending)
+    metrics.set_gauge("auth.hash_queue_depth", max(0, _hash_pending - PASSWORD_HASH_WORKERS))
+
+async def _run_in_hash_pool(func, *args):
+    """Run a hashing function on the bounded hash pool, shedding load when it is full"""
+    global _hash_pending
+    if _hash_pending >= PASSWORD_HASH_MAX_PENDING:
+        metrics.incr("auth.hash_rejected")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many sign-in requests, please try again",
+            headers={"Retry-After": "1"},
+        )
+    _hash_pending += 1
+    _report_hash_pending()
+    start = time.perf_counter()
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_hash_executor, func, *args)
+    finally:
+        _hash_pending -= 1
+        _report_hash_pending()
+        metrics.observe("auth.hash_seconds", time.perf_counter() - start)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await _run_in_hash_pool(verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    return await _run_in_hash_pool(get_password_hash, password)
+
+async def verify_and_update_password_async(plain_password: str, hashed_password: str):
+    return await _run_in_hash_pool(verify_and_update_password, plain_password, hashed_password)
+
+def create_access_token(data: dict, expires_delta: Optional[timedelta] = None, token_type: str = "access"):
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
     else:
         expire = datetime.utcnow() + timedelta(minutes=15)
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    to_encode.update({"exp": expire, "jti": uuid.uuid4().hex, "type": token_type})
+    encoded_jwt = _jwt().encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)], session: Session = Depends(get_session)):
-    credentials_exception = HTTPException(
+def create_refresh_token(data: dict):
+    return create_access_token(
+        data, expires_delta=timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS), token_type="refresh"
+    )
+
+def principal_stamp(role: Role, is_active: bool, hashed_password: str) -> str:
+    """Short fingerprint of the account state a token was issued against.
+    It changes on deactivation, role change or password change, which invalidates older tokens.
+    """
+    raw = f"{role.value if isinstance(role, Role) else role}|{int(is_active)}|{hashed_password}"
+    return hashlib.sha256(raw.encode()).hexdigest()[:16]
+
+def create_token_pair(user: User) -> dict:
+    """Issue a fresh access token plus rotating refresh token for a user"""
+    claims = {
+        "sub": user.email,
+        "role": user.role,
+        "uid": user.id,
+        "ver": principal_stamp(user.role, user.is_active, user.hashed_password),
+    }
+    return {
+        "access_token": create_access_token(
+            data=claims, expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+        ),
+        "refresh_token": create_refresh_token({"sub": user.email, "ver": claims["ver"]}),
+        "token_type": "bearer",
+        "expires_in": ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+    }
+
+def revoke_token(session: Session, payload: dict, user_id: Optional[int] = None):
+    """Revoke a decoded token until it would have expired anyway"""
+    jti = payload.get("jti")
+    if jti is None:
+        return
+    revocation_store.revoke(session, jti, datetime.utcfromtimestamp(payload["exp"]), user_id)
+
+def decode_access_token(token: str) -> dict:
+    """Verify a JWT and return its claims, reusing the result for tokens seen before.
+
+    Raises JWTError if the token is invalid or expired.
+    """
+    digest = hashlib.sha256(token.encode()).digest()
+    payload = token_cache.get(digest)
+    if payload is None:
+        payload = _jwt().decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        remaining = payload.get("exp", 0) - time.time()
+        if remaining > 0:
+            token_cache.set(digest, payload, ttl=remaining)
+    return payload
+
+def _credentials_exception():
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+async def _release(session: AsyncSession):
+    """End the auth lookup's transaction so its pooled connection is returned before the
+    handler runs; sync handlers would otherwise hold it idle next to their own session"""
+    if session.in_transaction():
+        await session.commit()
+
+async def _verified_access_claims(token: str, session: AsyncSession) -> dict:
+    """Decode an access token and reject refresh tokens and revoked tokens"""
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
+        payload = decode_access_token(token)
     except JWTError:
-        raise credentials_exception
+        raise _credentials_exception()
+    if payload.get("sub") is None or payload.get("type", "access") != "access":
+        raise _credentials_exception()
+    
+    jti = payload.get("jti")
+    if jti is not None and await revocation_store.is_revoked_async(session, jti):
+        raise _credentials_exception()
+    return payload
+
+async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)], session: AsyncSession = Depends(get_async_session)):
+    credentials_exception = _credentials_exception()
+    payload = await _verified_access_claims(token, session)
+    email: str = payload["sub"]
     
-    statement = select(User).where(User.email == email)
-    user = session.exec(statement).first()
-    if user is None:
+    cached = principal_cache.get(email)
+    if cached is None:
+        statement = select(User).where(User.email == email)
+        user = (await session.exec(statement)).first()
+        if user is None:
+            raise credentials_exception
+        cached = user.model_dump()
+        principal_cache.set(email, cached)
+    if not cached["is_active"]:
+        raise credentials_exception
+    # Tokens issued before a deactivation, role change or password change no longer match
+    ver = payload.get("ver")
+    if ver is not None and ver != principal_stamp(cached["role"], cached["is_active"], cached["hashed_password"]):
         raise credentials_exception
-    return user
+    await _release(session)
+    # Hand out a fresh detached copy: handlers can't mutate the cached entry,
+    # and the user isn't tied to the async session the lookup ran on
+    return User.model_validate(cached)
+
+async def get_current_principal(token: Annotated[str, Depends(oauth2_scheme)], session: AsyncSession = Depends(get_async_session)) -> Principal:
+    """
+    Lightweight alternative to get_current_user for endpoints that only need
+    the caller's id and role. Trusts the signed claims and only checks that the
+    account stamp is still current, which is cached per user.
+    """
+    payload = await _verified_access_claims(token, session)
+    user_id = payload.get("uid")
+    if user_id is None or payload.get("ver") is None:
+        # Token issued before claims-only auth; fall back to the full lookup
+        user = await get_current_user(token, session)
+        return Principal(id=user.id, email=user.email, role=user.role)
+    
+    stamp = stamp_cache.get(user_id)
+    if stamp is None:
+        row = (await session.exec(
+            select(User.role, User.is_active, User.hashed_password).where(User.id == user_id)
+        )).first()
+        if row is None:
+            raise _credentials_exception()
+        stamp = principal_stamp(*row)
+        stamp_cache.set(user_id, stamp)
+    if stamp != payload["ver"]:
+        raise _credentials_exception()
+    
+    await _release(session)
+    return Principal(id=user_id, email=payload["sub"], role=payload["role"])
+
+def invalidate_cached_user(user_id: int, *emails: str):
+    """Drop cached principals after a user's account details change"""
+    stamp_cache.invalidate(user_id)
+    for email in emails:
+        principal_cache.invalidate(email)
@@ -0,0 +1,56 @@
+# Benchmark: cost of get_current_user with and without the verified-token cache
+# Usage: python bench_auth.py [iterations]
+
+import asyncio
+import sys
+import time
+from datetime import timedelta
+from sqlalchemy.pool import StaticPool
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+from models import User, Role
+import auth
+
+def bench_get_current_user(iterations: int = 20000):
+    async def run_all():
+        engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+        async with engine.begin() as conn:
+            await conn.run_sync(SQLModel.metadata.create_all)
+
+        async with AsyncSession(engine, expire_on_commit=False) as session:
+            user = User(
+                email="bench@lms.com",
+                full_name="Bench User",
+                role=Role.student,
+                hashed_password="not-used",
+            )
+            session.add(user)
+            await session.commit()
+
+            token = auth.create_access_token(
+                data={"sub": user.email, "role": user.role},
+                expires_delta=timedelta(minutes=auth.ACCESS_TOKEN_EXPIRE_MINUTES),
+            )
+
+            async def run(use_token_cache: bool) -> float:
+                # Warm the principal cache so only token handling is being compared
+                await auth.get_current_user(token, session)
+                start = time.perf_counter()
+                for _ in range(iterations):
+                    if not use_token_cache:
+                        auth.token_cache.clear()
+                    await auth.get_current_user(token, session)
+                return time.perf_counter() - start
+
+            return await run(use_token_cache=False), await run(use_token_cache=True)
+
+    uncached, cached = asyncio.run(run_all())
+
+    print(f"get_current_user x {iterations}")
+    print(f"  jwt.decode every call: {uncached / iterations * 1e6:8.2f} us/call")
+    print(f"  verified-token cache:  {cached / iterations * 1e6:8.2f} us/call")
+    print(f"  speedup:               {uncached / cached:8.2f}x")
+
+if __name__ == "__main__":
+    bench_get_current_user(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
@@ -0,0 +1,109 @@
+# Benchmark: /gradebook/course/{id} for 500 students x 40 assignments, comparing
+# the old per-student loop with the endpoint (a read of the materialized
+# GradebookEntry rows). Reports queries and latency.
+# Usage: python bench_gradebook.py [--students 500] [--assignments 40] [--repeat 5]
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp(prefix='lms_gradebook_')}/bench.db"
+
+from sqlmodel import Session, SQLModel, select
+from database import engine
+from models import User, Role, Department, Course, Section, Semester, Enrollment, Assignment, Submission
+from routers.gradebook import get_course_gradebook
+from services.gradebook import rebuild
+import query_stats
+
+COURSE_ID = 1
+
+def seed(students: int, assignments: int):
+    rng = random.Random(7)
+    SQLModel.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(Department.__table__.insert(), [{"id": 1, "name": "CS", "code": "CS"}])
+        conn.execute(Semester.__table__.insert(), [{"id": 1, "name": "Fall", "is_active": True}])
+        conn.execute(Course.__table__.insert(), [{"id": COURSE_ID, "title": "Algorithms", "code": "CS-101", "department_id": 1}])
+        conn.execute(Section.__table__.insert(), [{"id": 1, "name": "Section A", "course_id": COURSE_ID, "semester_id": 1}])
+        conn.execute(User.__table__.insert(), [
+            {"id": i, "email": f"s{i}@lms.com", "full_name": f"Student {i}", "role": Role.student.name,
+             "hashed_password": "x", "is_active": True}
+            for i in range(1, students + 1)
+        ])
+        conn.execute(Enrollment.__table__.insert(), [{"student_id": i, "section_id": 1} for i in range(1, students + 1)])
+        conn.execute(Assignment.__table__.insert(), [
+            {"id": a, "title": f"A{a}", "description": "", "max_points": 100, "course_id": COURSE_ID,
+             "due_date": datetime(2026, 1, 5) + timedelta(days=a)}
+            for a in range(1, assignments + 1)
+        ])
+        conn.execute(Submission.__table__.insert(), [
+            {"assignment_id": a, "student_id": s, "content": "answer",
+             "grade": rng.randint(40, 100) if rng.random() < 0.9 else None}
+            for s in range(1, students + 1) for a in range(1, assignments + 1) if rng.random() < 0.95
+        ])
+    # Rows were inserted behind the API's back, so materialize the gradebook once
+    with Session(engine) as session:
+        rebuild(session, COURSE_ID)
+        session.commit()
+
+def legacy_gradebook(course_id: int, session: Session) -> list:
+    """The per-student loop this endpoint used before (grades only)"""
+    assignments = session.exec(
+        select(Assignment).where(Assignment.course_id == course_id).order_by(Assignment.due_date)
+    ).all()
+    enrollments = session.exec(select(Enrollment).join(Section).where(Section.course_id == course_id)).all()
+    rows = []
+    for student_id in set(e.student_id for e in enrollments):
+        student = session.get(User, student_id)
+        submissions = session.exec(
+            select(Submission).join(Assignment)
+            .where(Submission.student_id == student_id, Assignment.course_id == course_id)
+        ).all()
+        grades = {}
+        for assignment in assignments:
+            submission = next((s for s in submissions if s.assignment_id == assignment.id), None)
+            grades[assignment.id] = submission.grade if submission and submission.grade is not None else None
+        rows.append((student.id, grades))
+    return rows
+
+def measure(label: str, func, repeat: int):
+    timings, queries = [], 0
+    for _ in range(repeat):
+        # A fresh session per run, as each request gets its own
+        with Session(engine) as session:
+            stats = query_stats.start_request()
+            start = time.perf_counter()
+            result = func(session)
+            timings.append(time.perf_counter() - start)
+            queries = stats.count
+    best = min(timings)
+    print(f"  {label:<18} {queries:6d} queries  {best * 1000:9.1f} ms (best of {repeat})")
+    return best, result
+
+def main():
+    parser = argparse.ArgumentParser(description="Gradebook pivot benchmark")
+    parser.add_argument("--students", type=int, default=500)
+    parser.add_argument("--assignments", type=int, default=40)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    seed(args.students, args.assignments)
+    admin = User(id=0, email="admin@lms.com", full_name="Admin", role=Role.admin, hashed_password="x")
+    print(f"Gradebook for {args.students} students x {args.assignments} assignments")
+
+    legacy, legacy_rows = measure("per-student loop", lambda s: legacy_gradebook(COURSE_ID, s), args.repeat)
+    current, response = measure("gradebook endpoint", lambda s: get_course_gradebook(COURSE_ID, admin, s), args.repeat)
+    print(f"  speedup: {legacy / current:.1f}x")
+
+    expected = {student_id: grades for student_id, grades in legacy_rows}
+    same = len(expected) == len(response.students) and all(
+        expected[row.student_id] == row.grades for row in response.students
+    )
+    print("  results match" if same else "  RESULTS DIFFER")
+
+if __name__ == "__main__":
+    main()
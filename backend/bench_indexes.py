@@ -0,0 +1,164 @@
+# Benchmark: query plans and latency of the hot filters before and after the
+# composite indexes declared in models.py.
+# Seeds a temporary SQLite file, drops those indexes, measures, then recreates
+# them through migrations.create_missing_indexes and measures again.
+# Usage: python bench_indexes.py [--scale 1.0] [--repeat 200]
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import DateTime, bindparam, create_engine, text
+from sqlmodel import SQLModel
+from models import (
+    Announcement, Attendance, Enrollment, Lesson, Notification, QuizAttempt,
+    Section, Submission, ThreadReply,
+)
+from migrations import create_missing_indexes
+
+START = datetime(2026, 1, 5)
+
+# Hot lookups issued by the routers
+HOT_QUERIES = [
+    ("enrollment by student+section",
+     "SELECT * FROM enrollment WHERE student_id = :student AND section_id = :section"),
+    ("attendance for a class day",
+     "SELECT * FROM attendance WHERE section_id = :section AND date = :day"),
+    ("attendance history of a student",
+     "SELECT * FROM attendance WHERE student_id = :student AND section_id = :section"),
+    ("submission by assignment+student",
+     "SELECT * FROM submission WHERE assignment_id = :assignment AND student_id = :student"),
+    ("unread notifications",
+     "SELECT * FROM notification WHERE user_id = :student AND is_read = 0 ORDER BY created_at DESC"),
+    ("quiz attempts of a student",
+     "SELECT * FROM quizattempt WHERE quiz_id = :quiz AND student_id = :student"),
+    ("thread replies",
+     "SELECT * FROM threadreply WHERE thread_id = :thread ORDER BY created_at"),
+    ("course announcements",
+     "SELECT * FROM announcement WHERE course_id = :course ORDER BY is_pinned DESC, created_at DESC"),
+    ("section by course+name",
+     "SELECT * FROM section WHERE course_id = :course AND name = 'Section A'"),
+    ("course lessons",
+     'SELECT * FROM lesson WHERE course_id = :course ORDER BY "order"'),
+]
+
+def seed(engine, scale: float):
+    """Bulk insert synthetic rows; returns the hot-query parameters and the row count"""
+    rng = random.Random(42)
+    n = lambda count: max(1, int(count * scale))
+    courses, students, sections_per_course = n(2000), n(20000), 3
+    sections = courses * sections_per_course
+    assignments, quizzes, threads = courses * 5, courses * 2, courses * 4
+
+    rows = {
+        Section: [
+            {"id": c * sections_per_course + s + 1, "name": f"Section {'ABC'[s]}", "course_id": c + 1,
+             "semester_id": 1 + s}
+            for c in range(courses) for s in range(sections_per_course)
+        ],
+        Enrollment: [
+            {"student_id": st + 1, "section_id": sec}
+            for st in range(students)
+            for sec in rng.sample(range(1, sections + 1), 5)
+        ],
+        Attendance: [
+            {"section_id": rng.randint(1, sections), "student_id": rng.randint(1, students),
+             "date": START + timedelta(days=rng.randint(0, 120)), "status": "present", "marked_by": 1}
+            for _ in range(n(200000))
+        ],
+        Submission: [
+            {"assignment_id": a, "student_id": st, "content": "answer"}
+            for a, st in {(rng.randint(1, assignments), rng.randint(1, students)) for _ in range(n(150000))}
+        ],
+        Notification: [
+            {"user_id": rng.randint(1, students), "notification_type": "announcement", "title": "t",
+             "content": "c", "is_read": rng.random() < 0.8,
+             "created_at": START + timedelta(minutes=rng.randint(0, 200000))}
+            for _ in range(n(150000))
+        ],
+        QuizAttempt: [
+            {"quiz_id": rng.randint(1, quizzes), "student_id": rng.randint(1, students), "attempt_number": 1}
+            for _ in range(n(100000))
+        ],
+        ThreadReply: [
+            {"thread_id": rng.randint(1, threads), "content": "reply", "created_by": 1,
+             "created_at": START + timedelta(minutes=rng.randint(0, 200000))}
+            for _ in range(n(120000))
+        ],
+        Announcement: [
+            {"course_id": rng.randint(1, courses), "title": "t", "content": "c", "created_by": 1,
+             "is_pinned": rng.random() < 0.1, "created_at": START + timedelta(minutes=rng.randint(0, 200000))}
+            for _ in range(n(40000))
+        ],
+        Lesson: [
+            {"title": "l", "content": "c", "order": i % 20, "course_id": rng.randint(1, courses)}
+            for i in range(n(40000))
+        ],
+    }
+    with engine.begin() as conn:
+        for model, values in rows.items():
+            conn.execute(model.__table__.insert(), values)
+
+    sample = rows[Attendance][len(rows[Attendance]) // 2]
+    return {
+        "student": sample["student_id"], "section": sample["section_id"], "day": sample["date"],
+        "assignment": rng.randint(1, assignments), "quiz": rng.randint(1, quizzes),
+        "thread": rng.randint(1, threads), "course": rng.randint(1, courses),
+    }, sum(len(values) for values in rows.values())
+
+def _statement(sql: str):
+    # Dates must be bound through DateTime so they match the stored format
+    stmt = text(sql)
+    return stmt.bindparams(bindparam("day", type_=DateTime)) if ":day" in sql else stmt
+
+def measure(engine, params: dict, repeat: int) -> dict:
+    results = {}
+    with engine.connect() as conn:
+        for label, sql in HOT_QUERIES:
+            stmt = _statement(sql)
+            used = {k: v for k, v in params.items() if f":{k}" in sql}
+            plan = conn.execute(_statement("EXPLAIN QUERY PLAN " + sql), used).all()
+            conn.execute(stmt, used).all()  # warm the page cache
+            start = time.perf_counter()
+            for _ in range(repeat):
+                conn.execute(stmt, used).all()
+            results[label] = ((time.perf_counter() - start) / repeat, " / ".join(row[-1] for row in plan))
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare hot query plans with and without composite indexes")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiplier for the seeded row counts")
+    parser.add_argument("--repeat", type=int, default=200, help="executions per query")
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(prefix="lms_indexes_"), "bench.db")
+    engine = create_engine(f"sqlite:///{path}")
+    SQLModel.metadata.create_all(engine)
+    declared = [ix for table in SQLModel.metadata.sorted_tables for ix in table.indexes
+                if ix.name.startswith(("ix_", "ux_")) and len(ix.columns) > 1]
+    for index in declared:
+        index.drop(engine)
+
+    start = time.perf_counter()
+    params, total = seed(engine, args.scale)
+    print(f"Seeded {total} rows in {time.perf_counter() - start:.1f}s ({path})\n")
+
+    before = measure(engine, params, args.repeat)
+    start = time.perf_counter()
+    created = create_missing_indexes(engine)
+    with engine.begin() as conn:
+        conn.exec_driver_sql("ANALYZE")
+    print(f"Created {len(created)} indexes + ANALYZE in {time.perf_counter() - start:.1f}s\n")
+    after = measure(engine, params, args.repeat)
+
+    for label, _ in HOT_QUERIES:
+        (t_before, plan_before), (t_after, plan_after) = before[label], after[label]
+        print(f"{label}")
+        print(f"  before: {t_before * 1000:8.3f} ms  {plan_before}")
+        print(f"  after:  {t_after * 1000:8.3f} ms  {plan_after}")
+        print(f"  speedup: {t_before / t_after:6.1f}x\n")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+# Benchmark: password verification throughput, and a PASSWORD_HASH_ROUNDS
+# recommendation for a target login latency.
+# Usage: python bench_password_hash.py [--target-ms 50] [--rounds 29000] [--samples 20]
+
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from passlib.hash import pbkdf2_sha256
+from auth import PASSWORD_HASH_ROUNDS
+
+def time_verify(rounds: int, samples: int) -> float:
+    """Average seconds for one verify at the given cost"""
+    hashed = pbkdf2_sha256.using(rounds=rounds).hash("benchmark-password")
+    pbkdf2_sha256.verify("benchmark-password", hashed)  # warm up
+    start = time.perf_counter()
+    for _ in range(samples):
+        pbkdf2_sha256.verify("benchmark-password", hashed)
+    return (time.perf_counter() - start) / samples
+
+def parallel_throughput(rounds: int, samples: int, workers: int) -> float:
+    """Verifies/sec with `workers` threads (pbkdf2 releases the GIL)"""
+    hashed = pbkdf2_sha256.using(rounds=rounds).hash("benchmark-password")
+    total = samples * workers
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(lambda _: pbkdf2_sha256.verify("benchmark-password", hashed), range(total)))
+    return total / (time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description="Size pbkdf2 cost and login capacity")
+    parser.add_argument("--target-ms", type=float, default=50.0, help="latency budget for one verify")
+    parser.add_argument("--rounds", type=int, default=PASSWORD_HASH_ROUNDS, help="cost to measure")
+    parser.add_argument("--samples", type=int, default=20, help="verifies per measurement")
+    args = parser.parse_args()
+
+    cores = os.cpu_count() or 1
+    per_verify = time_verify(args.rounds, args.samples)
+    print(f"pbkdf2_sha256 @ {args.rounds} rounds")
+    print(f"  latency:              {per_verify * 1000:8.2f} ms/verify")
+    print(f"  throughput per core:  {1 / per_verify:8.1f} verifies/sec")
+    print(f"  throughput {cores:2d} threads: {parallel_throughput(args.rounds, args.samples, cores):8.1f} verifies/sec")
+
+    # Cost scales linearly with rounds
+    recommended = int(args.rounds * (args.target_ms / 1000) / per_verify) // 1000 * 1000
+    recommended = max(recommended, 1000)
+    check = time_verify(recommended, args.samples)
+    print(f"\nFor a {args.target_ms:.0f} ms budget:")
+    print(f"  PASSWORD_HASH_ROUNDS={recommended}")
+    print(f"  measured {check * 1000:.2f} ms/verify, {1 / check:.1f} verifies/sec per core")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+# Benchmark: the deadline spike on /quizzes/{id}/submit/{attempt_id}. Every student
+# of a class submits a 100-question quiz at once; compares the old per-question
+# ORM grading loop with submit_quiz (answer key + one bulk INSERT).
+# Reports queries per submission, wall time and throughput, and checks that both
+# paths store identical answers and scores. SQLite takes one writer at a time, so
+# the submissions run back to back: the spike is measured as per-submit cost.
+# Usage: python bench_quiz_submit.py [--students 800] [--questions 100]
+
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from datetime import datetime
+
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp(prefix='lms_quiz_')}/bench.db"
+
+from sqlalchemy import delete, update
+from sqlmodel import Session, SQLModel, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from database import engine, async_engine
+from models import (
+    User, Role, Department, Course, Quiz, Question, QuizAttempt, Answer, QuestionType, QuizSubmission,
+)
+from routers.quizzes import submit_quiz
+import query_stats
+
+QUIZ_ID = 1
+
+def seed(students: int, questions: int) -> dict:
+    """Create the quiz, one open attempt per student, and each student's answers"""
+    rng = random.Random(11)
+    SQLModel.metadata.create_all(engine)
+    question_rows = []
+    for q in range(1, questions + 1):
+        if q % 4 == 0:
+            question_rows.append({"id": q, "quiz_id": QUIZ_ID, "question_type": QuestionType.true_false.name,
+                                  "question_text": f"Q{q}", "points": 1.0, "order": q,
+                                  "options": None, "correct_answer": rng.choice(["True", "False"])})
+        else:
+            question_rows.append({"id": q, "quiz_id": QUIZ_ID, "question_type": QuestionType.mcq.name,
+                                  "question_text": f"Q{q}", "points": 2.0, "order": q,
+                                  "options": '["a", "b", "c", "d"]', "correct_answer": str(rng.randint(0, 3))})
+    with engine.begin() as conn:
+        conn.execute(Department.__table__.insert(), [{"id": 1, "name": "CS", "code": "CS"}])
+        conn.execute(User.__table__.insert(), [
+            {"id": i, "email": f"s{i}@lms.com", "full_name": f"Student {i}", "role": Role.student.name,
+             "hashed_password": "x", "is_active": True}
+            for i in range(1, students + 1)
+        ])
+        conn.execute(Course.__table__.insert(), [{"id": 1, "title": "Algorithms", "code": "CS-101", "department_id": 1}])
+        conn.execute(Quiz.__table__.insert(), [{"id": QUIZ_ID, "course_id": 1, "title": "Final", "created_by": 1,
+                                                "max_attempts": 1, "passing_score": 50}])
+        conn.execute(Question.__table__.insert(), question_rows)
+        conn.execute(QuizAttempt.__table__.insert(), [
+            {"id": i, "quiz_id": QUIZ_ID, "student_id": i, "attempt_number": 1, "started_at": datetime.utcnow()}
+            for i in range(1, students + 1)
+        ])
+    answers = {}
+    for student in range(1, students + 1):
+        answers[student] = {
+            str(q["id"]): (rng.choice(["true", "False"]) if q["question_type"] == QuestionType.true_false.name
+                           else str(rng.randint(0, 3)))
+            for q in question_rows if rng.random() < 0.97  # a few questions left blank
+        }
+    return answers
+
+def reset_attempts():
+    with engine.begin() as conn:
+        conn.execute(delete(Answer))
+        conn.execute(update(QuizAttempt).values(submitted_at=None, score=None, max_score=None, percentage=None))
+
+async def legacy_submit(session: AsyncSession, quiz_id: int, attempt_id: int, answers: dict):
+    """The per-question loop submit_quiz used before"""
+    attempt = await session.get(QuizAttempt, attempt_id)
+    questions = (await session.exec(select(Question).where(Question.quiz_id == quiz_id))).all()
+    total_score = 0.0
+    max_score = 0.0
+    for question in questions:
+        max_score += question.points
+        answer_text = answers.get(str(question.id), "")
+        is_correct = False
+        points_earned = 0.0
+        if question.question_type == QuestionType.true_false:
+            is_correct = answer_text.lower() == question.correct_answer.lower()
+        elif question.question_type == QuestionType.mcq:
+            is_correct = answer_text == question.correct_answer
+        if is_correct:
+            points_earned = question.points
+            total_score += points_earned
+        session.add(Answer(attempt_id=attempt_id, question_id=question.id, answer_text=answer_text,
+                           is_correct=is_correct, points_earned=points_earned))
+    attempt.submitted_at = datetime.utcnow()
+    attempt.score = total_score
+    attempt.max_score = max_score
+    attempt.percentage = (total_score / max_score * 100) if max_score > 0 else 0
+    session.add(attempt)
+    await session.commit()
+
+async def current_submit(session: AsyncSession, quiz_id: int, attempt_id: int, answers: dict):
+    student = User(id=attempt_id, email=f"s{attempt_id}@lms.com", full_name="", role=Role.student, hashed_password="x")
+    await submit_quiz(quiz_id, attempt_id, QuizSubmission(answers=answers), current_user=student, session=session)
+
+async def spike(submit, answers: dict):
+    """Submit every attempt, one request (and session) each"""
+    queries = []
+    start = time.perf_counter()
+    for student, student_answers in answers.items():
+        stats = query_stats.start_request()
+        async with AsyncSession(async_engine, expire_on_commit=False) as session:
+            await submit(session, QUIZ_ID, student, student_answers)
+        queries.append(stats.count)
+    return time.perf_counter() - start, sum(queries) / len(queries)
+
+def snapshot():
+    with Session(engine) as session:
+        attempts = session.exec(select(QuizAttempt.id, QuizAttempt.score, QuizAttempt.percentage)).all()
+        answers = session.exec(
+            select(Answer.attempt_id, Answer.question_id, Answer.answer_text, Answer.is_correct, Answer.points_earned)
+        ).all()
+    return sorted(attempts), sorted(answers)
+
+async def run(args):
+    answers = seed(args.students, args.questions)
+    print(f"{args.students} students submitting a {args.questions}-question quiz")
+    results = {}
+    for label, submit in [("per-question loop", legacy_submit), ("submit_quiz", current_submit)]:
+        reset_attempts()
+        elapsed, queries = await spike(submit, answers)
+        results[label] = (elapsed, snapshot())
+        print(f"  {label:<18} {queries:7.1f} queries/submit  {elapsed * 1000:9.1f} ms  "
+              f"{args.students / elapsed:8.1f} submits/s")
+    legacy, current = results["per-question loop"], results["submit_quiz"]
+    print(f"  speedup: {legacy[0] / current[0]:.1f}x")
+    print("  results match" if legacy[1] == current[1] else "  RESULTS DIFFER")
+
+def main():
+    parser = argparse.ArgumentParser(description="Quiz submission spike benchmark")
+    parser.add_argument("--students", type=int, default=800)
+    parser.add_argument("--questions", type=int, default=100)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
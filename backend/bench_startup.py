@@ -0,0 +1,104 @@
+# Benchmark: cold-start time of a worker (import main + lifespan startup), with a
+# per-module import breakdown in the style of `python -X importtime`.
+# Exits non-zero when the median exceeds the budget or a deferred dependency is
+# imported at startup again, so it can guard cold starts in CI.
+# Usage: python bench_startup.py [--runs 5] [--budget-ms 2000] [--top 15]
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+# Only needed by specific requests; importing them at startup is a regression
+DEFERRED_MODULES = ["jinja2", "smtplib", "email.mime.multipart", "jose.jwt", "passlib.context"]
+
+# Runs in a fresh interpreter so nothing is already imported
+CHILD = """
+import asyncio, json, sys, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+async def boot():
+    async with main.lifespan(main.app):
+        pass
+asyncio.run(boot())
+booted = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - start) * 1000,
+    "startup_ms": (booted - imported) * 1000,
+    "deferred_loaded": [m for m in %r if m in sys.modules],
+}))
+"""
+
+def run_child(env: dict, cwd: str, importtime: bool = False):
+    cmd = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", CHILD % DEFERRED_MODULES]
+    result = subprocess.run(cmd, env=env, cwd=cwd, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1]), result.stderr
+
+def parse_importtime(stderr: str) -> list:
+    """(module, self_us, cumulative_us) for each line of -X importtime output"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure and guard worker cold-start time")
+    parser.add_argument("--runs", type=int, default=5, help="cold starts to measure")
+    parser.add_argument("--budget-ms", type=float, default=2000.0, help="allowed median import + startup time")
+    parser.add_argument("--top", type=int, default=15, help="modules to list by import cost")
+    args = parser.parse_args()
+
+    # Boot from a scratch directory (main mounts ./uploads) against a scratch database
+    work_dir = tempfile.mkdtemp(prefix="lms_startup_")
+    os.makedirs(os.path.join(work_dir, "uploads"))
+    env = {
+        **os.environ,
+        "DATABASE_URL": f"sqlite:///{os.path.join(work_dir, 'startup.db')}",
+        "PYTHONPATH": os.path.dirname(os.path.abspath(__file__)),
+        "PYTHONWARNINGS": "ignore",
+    }
+
+    # The first boot creates the schema; later boots take the fast version check
+    first, _ = run_child(env, work_dir)
+    print(f"First boot (creates schema): import {first['import_ms']:.0f} ms, startup {first['startup_ms']:.0f} ms")
+
+    runs = [run_child(env, work_dir)[0] for _ in range(args.runs)]
+    imports = [r["import_ms"] for r in runs]
+    startups = [r["startup_ms"] for r in runs]
+    totals = [i + s for i, s in zip(imports, startups)]
+    print(f"Warm-schema boots x {args.runs}:")
+    print(f"  import main:  median {statistics.median(imports):7.0f} ms  (min {min(imports):.0f})")
+    print(f"  lifespan:     median {statistics.median(startups):7.0f} ms  (min {min(startups):.0f})")
+    print(f"  total:        median {statistics.median(totals):7.0f} ms  (budget {args.budget_ms:.0f})")
+
+    report, stderr = run_child(env, work_dir, importtime=True)
+    rows = parse_importtime(stderr)
+    print(f"\nTop {args.top} modules by self import time:")
+    for name, self_us, cumulative_us in sorted(rows, key=lambda r: r[1], reverse=True)[:args.top]:
+        print(f"  {self_us / 1000:7.1f} ms self  {cumulative_us / 1000:7.1f} ms cumulative  {name}")
+    print("\nProject modules (cumulative):")
+    for name, _, cumulative_us in rows:
+        if name in ("main", "database", "models", "auth", "migrations") or name.startswith(("routers.", "services.")):
+            print(f"  {cumulative_us / 1000:7.1f} ms  {name}")
+
+    failures = []
+    if report["deferred_loaded"]:
+        failures.append(f"deferred modules imported at startup: {', '.join(report['deferred_loaded'])}")
+    if statistics.median(totals) > args.budget_ms:
+        failures.append(f"median cold start {statistics.median(totals):.0f} ms exceeds {args.budget_ms:.0f} ms")
+    print()
+    for failure in failures:
+        print(f"❌ {failure}")
+    if failures:
+        sys.exit(1)
+    print("✅ Cold start within budget, heavy imports deferred")
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,242 @@
+import hashlib
+import math
+import time
+from typing import Optional
+from fastapi import Request, Response
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 from sqlmodel import SQLModel, create_engine, Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 from decouple import config
+from cache import TTLCache
+import metrics
+import query_stats
 
-DATABASE_URL = config("DATABASE_URL", default="sqlite:///./test.db") 
+DATABASE_URL = config("DATABASE_URL", default="sqlite:///./test.db")
 
 # Fix for Render/Heroku postgres URLs usually starting with postgres://
 if DATABASE_URL.startswith("postgres://"):
     DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
 
-engine = create_engine(DATABASE_URL, echo=False)
+def to_async_url(url: str) -> str:
+    """Map a sync database URL onto its async driver (aiosqlite / asyncpg)"""
+    if url.startswith("sqlite:"):
+        return url.replace("sqlite:", "sqlite+aiosqlite:", 1)
+    if url.startswith("postgresql+psycopg2:"):
+        return url.replace("postgresql+psycopg2:", "postgresql+asyncpg:", 1)
+    if url.startswith("postgresql:"):
+        return url.replace("postgresql:", "postgresql+asyncpg:", 1)
+    return url
+
+ASYNC_DATABASE_URL = config("ASYNC_DATABASE_URL", default=to_async_url(DATABASE_URL))
+
+# Optional read replica. Safe (GET) requests on routed endpoints read from it unless
+# the caller wrote recently or the replica is further behind than the lag tolerance.
+DATABASE_REPLICA_URL = config("DATABASE_REPLICA_URL", default="")
+if DATABASE_REPLICA_URL.startswith("postgres://"):
+    DATABASE_REPLICA_URL = DATABASE_REPLICA_URL.replace("postgres://", "postgresql://", 1)
+REPLICA_MAX_LAG_SECONDS = config("REPLICA_MAX_LAG_SECONDS", default=5, cast=float)
+REPLICA_LAG_CHECK_SECONDS = config("REPLICA_LAG_CHECK_SECONDS", default=5, cast=float)
+
+# Connection pool settings (applied to the sync and the async engine separately)
+DB_POOL_SIZE = config("DB_POOL_SIZE", default=10, cast=int)
+DB_MAX_OVERFLOW = config("DB_MAX_OVERFLOW", default=20, cast=int)
+DB_POOL_TIMEOUT = config("DB_POOL_TIMEOUT", default=30, cast=float)  # seconds to wait for a free connection
+DB_POOL_RECYCLE = config("DB_POOL_RECYCLE", default=1800, cast=int)  # seconds before a connection is replaced
+DB_POOL_PRE_PING = config("DB_POOL_PRE_PING", default=True, cast=bool)
+
+# SQLite tuning, applied to every new connection
+SQLITE_BUSY_TIMEOUT_MS = config("SQLITE_BUSY_TIMEOUT_MS", default=5000, cast=int)
+SQLITE_MMAP_SIZE = config("SQLITE_MMAP_SIZE", default=256 * 1024 * 1024, cast=int)
+SQLITE_CACHE_SIZE_KB = config("SQLITE_CACHE_SIZE_KB", default=64 * 1024, cast=int)
+
+
+class _CheckoutTimingMixin:
+    """Reports how long callers wait for a pooled connection"""
+    metric_prefix = "db"
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            metrics.incr(f"{self.metric_prefix}.pool_timeouts")
+            raise
+        finally:
+            metrics.observe(f"{self.metric_prefix}.pool_checkout_wait_seconds", time.perf_counter() - start)
+
+class TimedQueuePool(_CheckoutTimingMixin, QueuePool):
+    pass
+
+class TimedAsyncQueuePool(_CheckoutTimingMixin, AsyncAdaptedQueuePool):
+    metric_prefix = "db_async"
+
+
+def _is_sqlite(url: str) -> bool:
+    return url.startswith("sqlite")
+
+def _is_memory_sqlite(url: str) -> bool:
+    if not _is_sqlite(url):
+        return False
+    path = url.split("?")[0].split("://", 1)[-1]
+    return path in ("", "/:memory:") or "mode=memory" in url
+
+def _pool_kwargs(poolclass) -> dict:
+    return dict(
+        poolclass=poolclass,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+    )
+
+def _instrument(sync_engine, url: str, metric_prefix: str):
+    """Attach SQLite pragmas and the checked-out gauge to an engine's connections"""
+    if _is_sqlite(url):
+        @event.listens_for(sync_engine, "connect")
+        def set_sqlite_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            # WAL lets readers proceed during a write; busy_timeout waits instead of "database is locked"
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=NORMAL")
+            cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+            cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+            cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+            cursor.close()
+
+    @event.listens_for(sync_engine, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        metrics.set_gauge(f"{metric_prefix}.pool_checked_out", sync_engine.pool.checkedout())
+
+    @event.listens_for(sync_engine, "checkin")
+    def on_checkin(dbapi_connection, connection_record):
+        # The connection being returned is still counted while this event runs
+        metrics.set_gauge(f"{metric_prefix}.pool_checked_out", max(0, sync_engine.pool.checkedout() - 1))
+
+def build_engine(url: str):
+    """Create an engine with the configured pool, plus pragmas on SQLite"""
+    if _is_memory_sqlite(url):
+        # In-memory databases use SQLAlchemy's single-connection pool
+        new_engine = create_engine(url, echo=False)
+    else:
+        connect_args = {"check_same_thread": False} if _is_sqlite(url) else {}
+        new_engine = create_engine(url, echo=False, connect_args=connect_args, **_pool_kwargs(TimedQueuePool))
+        _instrument(new_engine, url, "db")
+    query_stats.instrument(new_engine)
+    return new_engine
+
+def build_async_engine(url: str):
+    """Async counterpart of build_engine, used by the AsyncSession dependency"""
+    if _is_memory_sqlite(url):
+        new_engine = create_async_engine(url, echo=False)
+    else:
+        new_engine = create_async_engine(url, echo=False, **_pool_kwargs(TimedAsyncQueuePool))
+        _instrument(new_engine.sync_engine, url, "db_async")
+    query_stats.instrument(new_engine.sync_engine)
+    return new_engine
+
+engine = build_engine(DATABASE_URL)
+async_engine = build_async_engine(ASYNC_DATABASE_URL)
+replica_engine = build_engine(DATABASE_REPLICA_URL) if DATABASE_REPLICA_URL else None
+
+SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+# Callers that wrote within the lag window read from the primary (read-your-writes).
+# A write response carries the time until which that caller should read from the
+# primary, as a cookie and a header the client echoes back, so the next request
+# honours it whichever worker serves it. Each worker also remembers its own
+# recent writers, keyed by a digest of the Authorization header.
+READ_PRIMARY_COOKIE = "lms_read_primary_until"
+READ_PRIMARY_HEADER = "X-Read-Primary-Until"
+_recent_writers = TTLCache("recent_writers", maxsize=50000, ttl=REPLICA_MAX_LAG_SECONDS)
+_replica_health = {"checked_at": float("-inf"), "lag": 0.0, "healthy": True}
+
+def _client_key(request: Request):
+    authorization = request.headers.get("authorization")
+    if authorization:
+        return hashlib.sha256(authorization.encode()).digest()
+    return request.client.host if request.client else None
+
+def note_write(request: Request, response: Optional[Response] = None):
+    """Remember that this caller just wrote, so its next reads go to the primary"""
+    if replica_engine is None:
+        return
+    key = _client_key(request)
+    if key is not None:
+        _recent_writers.set(key, True)
+    if response is not None:
+        until = f"{time.time() + REPLICA_MAX_LAG_SECONDS:.3f}"
+        response.headers[READ_PRIMARY_HEADER] = until
+        response.set_cookie(
+            READ_PRIMARY_COOKIE, until, max_age=math.ceil(REPLICA_MAX_LAG_SECONDS), httponly=True, samesite="lax"
+        )
+
+def _wrote_recently(request: Request) -> bool:
+    key = _client_key(request)
+    if key is not None and _recent_writers.get(key):
+        return True
+    # Set by whichever worker handled the write. A client can only use it to read
+    # from the primary, and never for longer than the lag window.
+    now = time.time()
+    for value in (request.headers.get(READ_PRIMARY_HEADER), request.cookies.get(READ_PRIMARY_COOKIE)):
+        try:
+            until = float(value)
+        except (TypeError, ValueError):
+            continue
+        if now < until <= now + REPLICA_MAX_LAG_SECONDS:
+            return True
+    return False
+
+def _measure_replica_lag() -> float:
+    if _is_sqlite(DATABASE_REPLICA_URL):
+        # Local SQLite stand-ins have no replication stream to measure
+        return 0.0
+    with replica_engine.connect() as conn:
+        return float(conn.exec_driver_sql(
+            "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+            "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+        ).scalar())
+
+def replica_is_fresh() -> bool:
+    """Whether the replica is reachable and within REPLICA_MAX_LAG_SECONDS (re-checked periodically)"""
+    now = time.monotonic()
+    if now - _replica_health["checked_at"] >= REPLICA_LAG_CHECK_SECONDS:
+        _replica_health["checked_at"] = now
+        try:
+            _replica_health["lag"] = _measure_replica_lag()
+            _replica_health["healthy"] = True
+        except Exception:
+            metrics.incr("db.replica_check_failures")
+            _replica_health["healthy"] = False
+        metrics.set_gauge("db.replica_lag_seconds", _replica_health["lag"])
+    return _replica_health["healthy"] and _replica_health["lag"] <= REPLICA_MAX_LAG_SECONDS
+
+def select_engine(request: Request):
+    """Pick the engine a request should read from"""
+    if replica_engine is None or request.method not in SAFE_METHODS:
+        return engine
+    if _wrote_recently(request):
+        metrics.incr("db.reads_primary_recent_write")
+        return engine
+    if not replica_is_fresh():
+        metrics.incr("db.reads_primary_replica_stale")
+        return engine
+    metrics.incr("db.reads_replica")
+    return replica_engine
 
 def get_session():
     with Session(engine) as session:
         yield session
+
+def get_routed_session(request: Request):
+    """Session for read endpoints: the replica when it is safe to use, otherwise the primary"""
+    with Session(select_engine(request)) as session:
+        yield session
+
+async def get_async_session():
+    # expire_on_commit=False: reading attributes after commit must not trigger implicit IO
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        yield session
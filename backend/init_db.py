@@ -1,14 +1,14 @@
 # Initialize PostgreSQL Database with Tables
 # Run this after setup_postgres.py creates the database
 
-from sqlmodel import SQLModel
 from database import engine
-from models import *  # Import all models
+from migrations import ensure_schema
 
 def init_db():
     """Create all tables in PostgreSQL"""
     print("Creating all tables in PostgreSQL...")
-    SQLModel.metadata.create_all(engine)
+    # Records the schema version too, so the server skips DDL on its next start
+    ensure_schema(engine, force=True)
     print("✅ All tables created successfully!")
     print("\nYou can now:")
     print("1. Run seed scripts to add test data")
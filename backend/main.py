@@ -1,15 +1,46 @@
-from fastapi import FastAPI
+import time
+_import_started = time.perf_counter()
+
+import asyncio
+import logging
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from contextlib import asynccontextmanager
-from sqlmodel import SQLModel
-from database import engine
-from routers import auth, courses, academic, assignments, admin, attendance, password_reset, gradebook, quizzes, rubrics, announcements, notifications, discussions, teacher
+from database import engine, note_write, SAFE_METHODS, READ_PRIMARY_HEADER
+from migrations import ensure_schema
+import metrics
+import query_stats
+from services import autosave, quiz_timer, token_revocation
+from routers import auth, courses, academic, assignments, admin, attendance, password_reset, gradebook, quizzes, rubrics, announcements, notifications, discussions, teacher, transcripts
+
+IMPORT_SECONDS = time.perf_counter() - _import_started
+logger = logging.getLogger("uvicorn.error")
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    SQLModel.metadata.create_all(engine)
+    # DDL only runs when the stored schema version differs from the models
+    start = time.perf_counter()
+    migrated = ensure_schema(engine)
+    schema_seconds = time.perf_counter() - start
+    metrics.set_gauge("startup.import_seconds", IMPORT_SECONDS)
+    metrics.set_gauge("startup.schema_check_seconds", schema_seconds)
+    logger.info(
+        "Startup: imports %.0f ms, schema %s in %.0f ms",
+        IMPORT_SECONDS * 1000, "migrated" if migrated else "up to date", schema_seconds * 1000,
+    )
+    # Background tasks: write-behind autosave flushes, the purge of expired token
+    # revocations, and the sweep that auto-submits quiz attempts past their time limit
+    stop = asyncio.Event()
+    tasks = [
+        asyncio.create_task(autosave.run(engine, stop)),
+        asyncio.create_task(token_revocation.run(engine, stop)),
+    ]
+    if quiz_timer.QUIZ_AUTOSUBMIT_ENABLED:
+        tasks.append(asyncio.create_task(quiz_timer.run(engine, stop)))
     yield
+    stop.set()
+    await asyncio.gather(*tasks)
 
 app = FastAPI(title="College LMS API", lifespan=lifespan)
 
@@ -26,8 +57,27 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Read-your-writes marker; the frontend echoes it back on its next requests
+    expose_headers=[READ_PRIMARY_HEADER],
 )
 
+@app.middleware("http")
+async def count_queries(request: Request, call_next):
+    """Count statements and DB time per request and flag repeated statements (N+1)"""
+    stats = query_stats.start_request(f"{request.method} {request.url.path}")
+    response = await call_next(request)
+    route = request.scope.get("route")
+    query_stats.report(stats, request.method, getattr(route, "path", request.url.path), response)
+    return response
+
+@app.middleware("http")
+async def track_writes(request: Request, call_next):
+    """Send a caller's reads to the primary for a short while after it writes, on any worker"""
+    response = await call_next(request)
+    if request.method not in SAFE_METHODS and response.status_code < 400:
+        note_write(request, response)
+    return response
+
 app.include_router(auth.router)
 app.include_router(password_reset.router)
 app.include_router(courses.router)
@@ -42,6 +92,7 @@ app.include_router(rubrics.router)
 app.include_router(announcements.router)
 app.include_router(notifications.router)
 app.include_router(discussions.router)
+app.include_router(transcripts.router)
 
 app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
 
@@ -0,0 +1,42 @@
+import threading
+from collections import defaultdict
+
+# Lightweight in-process metrics registry.
+# Counters only go up, gauges hold the latest value, timings keep count/total/max.
+
+_lock = threading.Lock()
+_counters = defaultdict(int)
+_gauges = {}
+_timings = {}
+
+def incr(name: str, value: int = 1):
+    with _lock:
+        _counters[name] += value
+
+def set_gauge(name: str, value: float):
+    with _lock:
+        _gauges[name] = value
+
+def observe(name: str, seconds: float):
+    with _lock:
+        timing = _timings.setdefault(name, {"count": 0, "total": 0.0, "max": 0.0})
+        timing["count"] += 1
+        timing["total"] += seconds
+        if seconds > timing["max"]:
+            timing["max"] = seconds
+
+def snapshot() -> dict:
+    """Return a copy of all metrics, safe to serialize as JSON"""
+    with _lock:
+        timings = {
+            name: {
+                **t,
+                "avg": t["total"] / t["count"] if t["count"] else 0.0,
+            }
+            for name, t in _timings.items()
+        }
+        return {
+            "counters": dict(_counters),
+            "gauges": dict(_gauges),
+            "timings": timings,
+        }
@@ -0,0 +1,159 @@
+# Schema setup and upgrades, gated by a version stored in the database.
+# Startup compares the stored version with a fingerprint of the declared schema
+# and only runs DDL when they differ, so restarts skip create_all's reflection.
+# The version is only recorded once every column and index was applied; if one
+# failed (say, a unique index over duplicate rows) the next start tries again.
+# Usage: python migrations.py [--force]
+
+import hashlib
+import logging
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import delete, inspect, insert, select
+from sqlalchemy.exc import IntegrityError, OperationalError, ProgrammingError
+from sqlalchemy.schema import CreateColumn, CreateIndex, CreateTable
+from sqlmodel import Session, SQLModel
+from models import GradebookEntry, SchemaVersion
+
+logger = logging.getLogger(__name__)
+
+# Arbitrary key for pg_advisory_xact_lock, so only one worker migrates at a time
+_MIGRATION_LOCK_ID = 7_240_315
+
+def schema_fingerprint(dialect) -> str:
+    """Hash of the DDL for every declared table and index; changes whenever the models do"""
+    digest = hashlib.sha256()
+    for table in SQLModel.metadata.sorted_tables:
+        digest.update(str(CreateTable(table).compile(dialect=dialect)).encode())
+        for index in sorted(table.indexes, key=lambda ix: ix.name):
+            digest.update(str(CreateIndex(index).compile(dialect=dialect)).encode())
+    return digest.hexdigest()[:16]
+
+def _read_version(conn):
+    if not inspect(conn).has_table(SchemaVersion.__tablename__):
+        return None
+    return conn.execute(select(SchemaVersion.version).where(SchemaVersion.id == 1)).scalar()
+
+def add_missing_columns(bind, failed: Optional[list] = None) -> list:
+    """Add declared columns that existing tables lack; returns them as "table.column".
+
+    Only nullable columns without a server default can be added to tables that
+    already hold rows; anything else is logged, appended to failed, and left for
+    a manual migration.
+    """
+    inspector = inspect(bind)
+    existing_tables = set(inspector.get_table_names())
+    added = []
+    for table in SQLModel.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        present = {col["name"] for col in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in present:
+                continue
+            if not column.nullable or column.server_default is not None:
+                logger.warning("Cannot add column %s.%s automatically", table.name, column.name)
+                if failed is not None:
+                    failed.append(f"{table.name}.{column.name}")
+                continue
+            spec = CreateColumn(column).compile(dialect=bind.dialect)
+            bind.exec_driver_sql(f"ALTER TABLE {bind.dialect.identifier_preparer.format_table(table)} ADD COLUMN {spec}")
+            added.append(f"{table.name}.{column.name}")
+    return added
+
+def create_missing_indexes(bind, failed: Optional[list] = None) -> list:
+    """Create every declared index that the database does not have yet; returns their names.
+
+    Indexes that could not be created are logged and appended to failed.
+    """
+    inspector = inspect(bind)
+    existing_tables = set(inspector.get_table_names())
+    # A failed statement aborts a Postgres transaction, so each attempt gets a savepoint
+    use_savepoint = bind.dialect.name == "postgresql" and hasattr(bind, "begin_nested")
+    created = []
+    for table in SQLModel.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        present = {ix["name"] for ix in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name in present:
+                continue
+            savepoint = bind.begin_nested() if use_savepoint else None
+            try:
+                index.create(bind)
+                if savepoint:
+                    savepoint.commit()
+                created.append(index.name)
+            except (IntegrityError, OperationalError, ProgrammingError) as exc:
+                if savepoint:
+                    savepoint.rollback()
+                # A unique index fails when old rows already contain duplicates;
+                # those need cleaning up by hand before the constraint can apply.
+                logger.warning("Could not create index %s on %s: %s", index.name, table.name, exc)
+                if failed is not None:
+                    failed.append(index.name)
+    return created
+
+def _backfill_new_tables(conn, existing_tables: set):
+    """Populate derived tables that were just created on a database that already has data"""
+    if not existing_tables:
+        return
+    if GradebookEntry.__tablename__ not in existing_tables:
+        from services import gradebook
+        with Session(bind=conn) as session:
+            logger.info("Backfilled %d gradebook rows", gradebook.rebuild(session))
+
+def _backfill_new_columns(conn, added: list):
+    """Fill columns that were just added to tables with existing rows"""
+    if "quizattempt.expires_at" in added:
+        from services import quiz_timer
+        with Session(bind=conn) as session:
+            logger.info("Set deadlines on %d open quiz attempts", quiz_timer.backfill_deadlines(session))
+
+def ensure_schema(engine, force: bool = False) -> bool:
+    """Bring the database up to the declared schema if its stored version differs.
+
+    Returns True when DDL ran, False when the version already matched. If a
+    column or index could not be applied the version is not stored, so the
+    next call retries.
+    """
+    version = schema_fingerprint(engine.dialect)
+    if not force:
+        with engine.connect() as conn:
+            if _read_version(conn) == version:
+                return False
+
+    with engine.begin() as conn:
+        if conn.dialect.name == "postgresql":
+            conn.exec_driver_sql(f"SELECT pg_advisory_xact_lock({_MIGRATION_LOCK_ID})")
+            # Another worker may have finished while we waited for the lock
+            if not force and _read_version(conn) == version:
+                return False
+        existing_tables = set(inspect(conn).get_table_names())
+        SQLModel.metadata.create_all(conn)
+        failed = []
+        added = add_missing_columns(conn, failed)
+        created = create_missing_indexes(conn, failed)
+        _backfill_new_tables(conn, existing_tables)
+        _backfill_new_columns(conn, added)
+        if not failed:
+            conn.execute(delete(SchemaVersion))
+            conn.execute(insert(SchemaVersion).values(id=1, version=version, applied_at=datetime.utcnow()))
+    if failed:
+        logger.warning(
+            "Schema version %s not recorded, will retry on next start (failed: %s)", version, ", ".join(failed)
+        )
+    logger.info(
+        "Schema upgraded to %s (new columns: %s; new indexes: %s)",
+        version, ", ".join(added) or "-", ", ".join(created) or "-",
+    )
+    return True
+
+if __name__ == "__main__":
+    import sys
+    from database import engine
+    logging.basicConfig(level=logging.INFO)
+    if ensure_schema(engine, force="--force" in sys.argv):
+        print(f"Schema is now at version {schema_fingerprint(engine.dialect)}")
+    else:
+        print("Schema already up to date")
@@ -1,5 +1,6 @@
 from datetime import datetime
 from typing import Optional, List
+from sqlalchemy import Index
 from sqlmodel import Field, SQLModel, Relationship
 from enum import Enum
 
@@ -84,6 +85,10 @@ class CourseMaterial(SQLModel, table=True):
     course: Course = Relationship(back_populates="materials")
 
 class Lesson(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_lesson_course_order", "course_id", "order"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     title: str
     content: str
@@ -121,6 +126,10 @@ class SectionBase(SQLModel):
     schedule: Optional[str] = None # e.g. "Mon/Wed 10:00 - 11:30"
 
 class Section(SectionBase, table=True):
+    __table_args__ = (
+        Index("ix_section_course_name", "course_id", "name"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     
     course: Course = Relationship(back_populates="sections")
@@ -137,8 +146,8 @@ class UserBase(SQLModel):
     is_active: bool = True
     
     # New Fields
-    program_id: Optional[int] = Field(default=None, foreign_key="program.id") # For Students
-    batch_id: Optional[int] = Field(default=None, foreign_key="batch.id") # For Students - Cohort tracking
+    program_id: Optional[int] = Field(default=None, foreign_key="program.id", index=True) # For Students
+    batch_id: Optional[int] = Field(default=None, foreign_key="batch.id", index=True) # For Students - Cohort tracking
 
 class User(UserBase, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
@@ -168,6 +177,10 @@ class SectionRead(SectionBase):
     teacher: Optional["User"] = None
 
 class Enrollment(SQLModel, table=True):
+    __table_args__ = (
+        Index("ux_enrollment_student_section", "student_id", "section_id", unique=True),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     student_id: int = Field(foreign_key="user.id")
     section_id: int = Field(foreign_key="section.id")
@@ -186,6 +199,8 @@ class Assignment(SQLModel, table=True):
     due_date: datetime
     max_points: int = 100
     course_id: int = Field(foreign_key="course.id")
+    # Set on every grade write; cached grade statistics are checked against it
+    grades_changed_at: Optional[datetime] = Field(default_factory=datetime.utcnow)
     
     course: Course = Relationship(back_populates="assignments")
     submissions: List["Submission"] = Relationship(back_populates="assignment")
@@ -198,6 +213,10 @@ class AssignmentCreate(SQLModel):
     course_id: int
 
 class Submission(SQLModel, table=True):
+    __table_args__ = (
+        Index("ux_submission_assignment_student", "assignment_id", "student_id", unique=True),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     assignment_id: int = Field(foreign_key="assignment.id")
     student_id: int = Field(foreign_key="user.id")
@@ -217,6 +236,21 @@ class GradeSubmission(SQLModel):
     grade: float
     feedback: Optional[str] = None
 
+class GradebookEntry(SQLModel, table=True):
+    """Materialized gradebook row per (course, student), kept current on every grade change"""
+    __table_args__ = (
+        Index("ux_gradebookentry_course_student", "course_id", "student_id", unique=True),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    course_id: int = Field(foreign_key="course.id")
+    student_id: int = Field(foreign_key="user.id")
+    grades: str = "{}"  # JSON string of {assignment_id: grade}
+    total_points: float = 0.0
+    max_points: float = 0.0
+    percentage: float = 0.0
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
 
 # --- Admin & Policies ---
 
@@ -232,6 +266,26 @@ class GradingScale(SQLModel, table=True):
     min_percentage: float # e.g. 90.0
     gpa_point: float # e.g. 4.0
 
+class GradingScaleEntry(SQLModel):
+    grade_letter: str
+    min_percentage: float
+    gpa_point: float
+
+class GradeCategory(str, Enum):
+    assignment = "assignment"
+    quiz = "quiz"
+
+class GradeWeight(SQLModel, table=True):
+    """Relative weight of a grade category in a course's final grade"""
+    __table_args__ = (
+        Index("ux_gradeweight_course_category", "course_id", "category", unique=True),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    course_id: int = Field(foreign_key="course.id")
+    category: GradeCategory
+    weight: float  # e.g. 60 for assignments and 40 for quizzes; normalized when applied
+
 class AuditLog(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     action: str # e.g. "GRADE_CHANGE"
@@ -248,6 +302,21 @@ class PasswordResetToken(SQLModel, table=True):
     used: bool = Field(default=False)
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
+class RevokedToken(SQLModel, table=True):
+    jti: str = Field(primary_key=True)  # JWT ID of the revoked access/refresh token
+    user_id: Optional[int] = None  # No FK so revocations don't block user deletion
+    expires_at: datetime = Field(index=True)  # Row can be purged once the token expires
+    revoked_at: datetime = Field(default_factory=datetime.utcnow, index=True)
+
+class SchemaVersion(SQLModel, table=True):
+    id: int = Field(default=1, primary_key=True)  # Single row
+    version: str  # Fingerprint of the DDL the database was last brought up to
+    applied_at: datetime = Field(default_factory=datetime.utcnow)
+
+class TranscriptVersion(SQLModel, table=True):
+    id: int = Field(default=1, primary_key=True)  # Single row
+    version: int = Field(default=0)  # Bumped whenever final grades, the grading scale or credit hours change
+
 # --- Attendance ---
 
 class AttendanceStatus(str, Enum):
@@ -256,6 +325,11 @@ class AttendanceStatus(str, Enum):
     late = "late"
 
 class Attendance(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_attendance_section_date", "section_id", "date"),
+        Index("ix_attendance_student_section", "student_id", "section_id"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     section_id: int = Field(foreign_key="section.id")
     student_id: int = Field(foreign_key="user.id")
@@ -290,6 +364,10 @@ class Quiz(SQLModel, table=True):
     available_until: Optional[datetime] = None
     created_by: int = Field(foreign_key="user.id")
     created_at: datetime = Field(default_factory=datetime.utcnow)
+    # Bumped with every edit to the quiz or its questions; compiled quizzes are cached against it
+    version: Optional[int] = Field(default=0)
+    # Set whenever an attempt is graded; cached grade statistics are checked against it
+    grades_changed_at: Optional[datetime] = Field(default_factory=datetime.utcnow)
     
     course: Course = Relationship(back_populates="quizzes")
     questions: List["Question"] = Relationship(back_populates="quiz", cascade_delete=True)
@@ -311,11 +389,18 @@ class Question(SQLModel, table=True):
     answers: List["Answer"] = Relationship(back_populates="question", cascade_delete=True)
 
 class QuizAttempt(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_quizattempt_quiz_student", "quiz_id", "student_id"),
+        # Open attempts by deadline, for the auto-submit sweep
+        Index("ix_quizattempt_open_expires", "submitted_at", "expires_at"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     quiz_id: int = Field(foreign_key="quiz.id", ondelete="CASCADE")
     student_id: int = Field(foreign_key="user.id")
     attempt_number: int = Field(default=1)
     started_at: datetime = Field(default_factory=datetime.utcnow)
+    expires_at: Optional[datetime] = None  # started_at + the quiz's time limit; None when untimed
     submitted_at: Optional[datetime] = None
     score: Optional[float] = None  # calculated score
     max_score: Optional[float] = None
@@ -324,6 +409,7 @@ class QuizAttempt(SQLModel, table=True):
     quiz: Quiz = Relationship(back_populates="attempts")
     student: User = Relationship()
     answers: List["Answer"] = Relationship(back_populates="attempt", cascade_delete=True)
+    drafts: List["DraftAnswer"] = Relationship(cascade_delete=True)
 
 class Answer(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
@@ -336,6 +422,18 @@ class Answer(SQLModel, table=True):
     attempt: QuizAttempt = Relationship(back_populates="answers")
     question: Question = Relationship(back_populates="answers")
 
+class DraftAnswer(SQLModel, table=True):
+    """Autosaved answer of an attempt still in progress (see services/autosave.py)"""
+    __table_args__ = (
+        Index("ux_draftanswer_attempt_question", "attempt_id", "question_id", unique=True),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    attempt_id: int = Field(foreign_key="quizattempt.id", ondelete="CASCADE")
+    question_id: int = Field(foreign_key="question.id", ondelete="CASCADE")
+    answer_text: str
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
 # Pydantic models for API
 class QuestionCreate(SQLModel):
     question_type: QuestionType
@@ -356,6 +454,22 @@ class QuizCreate(SQLModel):
     available_until: Optional[str] = None
     questions: List[QuestionCreate] = []
 
+class QuestionUpdate(SQLModel):
+    question_text: Optional[str] = None
+    points: Optional[float] = None
+    order: Optional[int] = None
+    options: Optional[List[str]] = None
+    correct_answer: Optional[str] = None
+
+class QuizUpdate(SQLModel):
+    title: Optional[str] = None
+    description: Optional[str] = None
+    time_limit: Optional[int] = None
+    max_attempts: Optional[int] = None
+    passing_score: Optional[float] = None
+    available_from: Optional[str] = None
+    available_until: Optional[str] = None
+
 class QuizSubmission(SQLModel):
     answers: dict  # question_id -> answer_text
 
@@ -396,6 +510,10 @@ class RubricCreate(SQLModel):
 # --- Announcements ---
 
 class Announcement(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_announcement_course_pinned_created", "course_id", "is_pinned", "created_at"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     course_id: int = Field(foreign_key="course.id")
     title: str
@@ -424,6 +542,10 @@ class NotificationType(str, Enum):
     discussion_reply = "discussion_reply"
 
 class Notification(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_notification_user_read_created", "user_id", "is_read", "created_at"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     user_id: int = Field(foreign_key="user.id")
     notification_type: NotificationType
@@ -458,6 +580,10 @@ class DiscussionThread(SQLModel, table=True):
     replies: List["ThreadReply"] = Relationship(back_populates="thread", cascade_delete=True)
 
 class ThreadReply(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_threadreply_thread_created", "thread_id", "created_at"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     thread_id: int = Field(foreign_key="discussionthread.id", ondelete="CASCADE")
     content: str
@@ -0,0 +1,82 @@
+import logging
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Optional
+from decouple import config
+from sqlalchemy import event
+import metrics
+import slow_queries
+
+logger = logging.getLogger(__name__)
+
+# Dev mode: attach X-DB-Queries / X-DB-Time to every response
+QUERY_STATS_HEADERS = config("QUERY_STATS_HEADERS", default=False, cast=bool)
+# A statement shape repeated this many times in one request is reported as a likely N+1
+N_PLUS_ONE_THRESHOLD = config("N_PLUS_ONE_THRESHOLD", default=10, cast=int)
+
+
+class RequestQueryStats:
+    """Statements issued while handling one request"""
+
+    def __init__(self, route: str = None):
+        self.route = route
+        self.count = 0
+        self.seconds = 0.0
+        # Statement text is already parameterised, so identical text means identical shape
+        self.shapes = Counter()
+
+    def record(self, statement: str, seconds: float):
+        self.count += 1
+        self.seconds += seconds
+        self.shapes[statement] += 1
+
+    def repeated_shapes(self, threshold: int = None):
+        threshold = threshold or N_PLUS_ONE_THRESHOLD
+        return [(statement, n) for statement, n in self.shapes.most_common() if n >= threshold]
+
+
+_current: ContextVar[Optional[RequestQueryStats]] = ContextVar("request_query_stats", default=None)
+
+def start_request(route: str = None) -> RequestQueryStats:
+    stats = RequestQueryStats(route)
+    _current.set(stats)
+    return stats
+
+def current() -> Optional[RequestQueryStats]:
+    return _current.get()
+
+def instrument(sync_engine):
+    """Time every statement on this engine, attribute it to the current request and log slow ones"""
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        stats = _current.get()
+        if stats is not None:
+            stats.record(statement, elapsed)
+        if elapsed >= slow_queries.SLOW_QUERY_SECONDS:
+            slow_queries.capture(
+                conn, statement, parameters, executemany, elapsed, stats.route if stats else None
+            )
+
+def report(stats: RequestQueryStats, method: str, path: str, response):
+    """Publish one request's statement counts as metrics, a warning on N+1, and dev headers"""
+    metrics.observe("db.request_query_seconds", stats.seconds)
+    metrics.incr("db.request_queries", stats.count)
+
+    repeated = stats.repeated_shapes()
+    if repeated:
+        metrics.incr("db.n_plus_one_requests")
+        statement, n = repeated[0]
+        logger.warning(
+            "Likely N+1 on %s %s: %d queries in %.1f ms; repeated %dx: %s",
+            method, path, stats.count, stats.seconds * 1000, n, " ".join(statement.split())[:200],
+        )
+
+    if QUERY_STATS_HEADERS:
+        response.headers["X-DB-Queries"] = str(stats.count)
+        response.headers["X-DB-Time"] = f"{stats.seconds * 1000:.1f}ms"
@@ -0,0 +1,18 @@
+# Recompute the materialized gradebook (GradebookEntry) from enrollments and
+# submissions, repairing any rows that drifted.
+# Usage: python rebuild_gradebook.py [course_id]
+
+import sys
+from sqlmodel import Session
+from database import engine
+from services.gradebook import rebuild
+
+def rebuild_gradebook(course_id: int = None):
+    with Session(engine) as session:
+        changed = rebuild(session, course_id)
+        session.commit()
+    scope = f"course {course_id}" if course_id is not None else "all courses"
+    print(f"✅ Gradebook rebuilt for {scope}: {changed} row(s) repaired")
+
+if __name__ == "__main__":
+    rebuild_gradebook(int(sys.argv[1]) if len(sys.argv) > 1 else None)
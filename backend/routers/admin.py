@@ -1,9 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlmodel import Session, select, func
+from sqlmodel import Session, select, func, delete
 from database import get_session
-from models import User, Role, Department, Program, Batch, Course, Section, Semester, AuditLog, UserCreate, UserUpdate, CourseUpdate, BatchCreate, BatchUpdate
-from auth import get_current_user, get_password_hash
+from models import User, Role, Department, Program, Batch, Course, Section, Semester, AuditLog, UserCreate, UserUpdate, CourseUpdate, BatchCreate, BatchUpdate, GradingScale, GradingScaleEntry
+from auth import get_current_user, get_password_hash, invalidate_cached_user
 from typing import List, Dict, Any, Optional
+import metrics
+import slow_queries
+from services import grading, transcript
 
 router = APIRouter(
     prefix="/admin",
@@ -35,6 +38,50 @@ def get_stats(
         "departments": total_departments
     }
 
+@router.get("/metrics")
+def get_metrics(admin: User = Depends(get_current_admin)):
+    """In-process performance metrics for this worker"""
+    return metrics.snapshot()
+
+@router.get("/slow-queries")
+def get_slow_queries(limit: int = 20, admin: User = Depends(get_current_admin)):
+    """Slowest statements seen by this worker, by total time, with their last query plan"""
+    return {
+        "threshold_seconds": slow_queries.SLOW_QUERY_SECONDS,
+        "log_path": slow_queries.SLOW_QUERY_LOG_PATH,
+        "queries": slow_queries.top_offenders(limit),
+    }
+
+# --- Grading Scale ---
+
+@router.get("/grading-scale", response_model=List[GradingScaleEntry])
+def get_grading_scale(
+    session: Session = Depends(get_session),
+    admin: User = Depends(get_current_admin)
+):
+    """Letter grade thresholds, highest first (the built-in default when none are set)"""
+    scale = grading.load_scale(session)
+    return [
+        GradingScaleEntry(grade_letter=l, min_percentage=m, gpa_point=p)
+        for l, m, p in reversed(list(zip(scale.letters, scale.thresholds, scale.points)))
+    ]
+
+@router.put("/grading-scale", response_model=List[GradingScaleEntry])
+def set_grading_scale(
+    entries: List[GradingScaleEntry],
+    session: Session = Depends(get_session),
+    admin: User = Depends(get_current_admin)
+):
+    """Replace the whole grading scale"""
+    if not entries:
+        raise HTTPException(status_code=400, detail="Grading scale cannot be empty")
+    session.exec(delete(GradingScale))
+    session.add_all([GradingScale.model_validate(entry) for entry in entries])
+    # Every transcript's GPA points come from the scale
+    transcript.bump_version(session)
+    session.commit()
+    return sorted(entries, key=lambda e: e.min_percentage, reverse=True)
+
 # --- User Management ---
 
 @router.get("/users", response_model=List[User])
@@ -100,6 +147,8 @@ def update_user(
         if existing:
             raise HTTPException(status_code=400, detail="Email already registered")
     
+    old_email = user.email
+    
     # Update user fields
     user.email = user_data.email
     user.full_name = user_data.full_name
@@ -113,6 +162,7 @@ def update_user(
     session.add(user)
     session.commit()
     session.refresh(user)
+    invalidate_cached_user(user.id, old_email, user.email)
     
     # Audit Log
     log = AuditLog(
@@ -140,6 +190,7 @@ def delete_user(
         # Delete user - this will fail if there are foreign key constraints
         session.delete(user)
         session.commit()
+        invalidate_cached_user(user_id, user.email)
         
         # Audit Log
         log = AuditLog(
@@ -178,6 +229,7 @@ def toggle_user_active(
     session.add(user)
     session.commit()
     session.refresh(user)
+    invalidate_cached_user(user_id, user.email)
     
     # Audit Log
     action_status = "ACTIVATE_USER" if user.is_active else "DEACTIVATE_USER"
@@ -459,6 +511,8 @@ def update_course(
         setattr(course, key, value)
     
     session.add(course)
+    if "credit_hours" in update_data:
+        transcript.bump_version(session)
     session.commit()
     session.refresh(course)
     
@@ -542,6 +596,7 @@ def delete_course(
     
     code = course.code
     session.delete(course)
+    transcript.bump_version(session)
     session.commit()
     
     # Audit Log
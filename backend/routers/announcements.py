@@ -1,9 +1,9 @@
 from typing import List
 from fastapi import APIRouter, Depends, HTTPException
 from sqlmodel import Session, select
-from database import get_session
+from database import get_session, get_routed_session
 from models import User, Role, Announcement, AnnouncementCreate
-from auth import get_current_user
+from auth import get_current_user, get_current_principal, Principal
 
 router = APIRouter(
     prefix="/announcements",
@@ -38,8 +38,8 @@ def create_announcement(
 @router.get("/course/{course_id}")
 def get_course_announcements(
     course_id: int,
-    current_user: User = Depends(get_current_user),
-    session: Session = Depends(get_session)
+    current_user: Principal = Depends(get_current_principal),
+    session: Session = Depends(get_routed_session)
 ):
     """Get all announcements for a course"""
     announcements = session.exec(
@@ -62,8 +62,8 @@ def get_course_announcements(
 @router.get("/{announcement_id}")
 def get_announcement(
     announcement_id: int,
-    current_user: User = Depends(get_current_user),
-    session: Session = Depends(get_session)
+    current_user: Principal = Depends(get_current_principal),
+    session: Session = Depends(get_routed_session)
 ):
     """Get a single announcement"""
     announcement = session.get(Announcement, announcement_id)
@@ -1,10 +1,11 @@
 from typing import List, Optional
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
-from sqlmodel import Session, select
-from database import get_session
-from models import Assignment, AssignmentCreate, Submission, SubmissionCreate, GradeSubmission, User, Role, Course
+from sqlmodel import Session, select, delete
+from database import get_session, get_routed_session
+from models import Assignment, AssignmentCreate, Submission, SubmissionCreate, GradeSubmission, User, Role, Course, Section
 from auth import get_current_user
 from datetime import datetime
+from services import grade_stats, gradebook
 
 router = APIRouter(
     prefix="/assignments",
@@ -32,6 +33,8 @@ def create_assignment(
     
     db_assignment = Assignment.model_validate(assignment)
     session.add(db_assignment)
+    session.flush()
+    gradebook.assignment_added(session, db_assignment)
     session.commit()
     session.refresh(db_assignment)
     return db_assignment
@@ -39,7 +42,7 @@ def create_assignment(
 @router.get("/course/{course_id}", response_model=List[Assignment])
 def get_course_assignments(
     course_id: int,
-    session: Session = Depends(get_session)
+    session: Session = Depends(get_routed_session)
 ):
     assignments = session.exec(select(Assignment).where(Assignment.course_id == course_id)).all()
     return assignments
@@ -47,13 +50,43 @@ def get_course_assignments(
 @router.get("/{assignment_id}", response_model=Assignment)
 def get_assignment(
     assignment_id: int,
-    session: Session = Depends(get_session)
+    session: Session = Depends(get_routed_session)
 ):
     assignment = session.get(Assignment, assignment_id)
     if not assignment:
         raise HTTPException(status_code=404, detail="Assignment not found")
     return assignment
 
+@router.delete("/{assignment_id}")
+def delete_assignment(
+    assignment_id: int,
+    current_user: User = Depends(get_current_user),
+    session: Session = Depends(get_session)
+):
+    if current_user.role not in [Role.teacher, Role.admin]:
+        raise HTTPException(status_code=403, detail="Only teachers can delete assignments")
+    
+    assignment = session.get(Assignment, assignment_id)
+    if not assignment:
+        raise HTTPException(status_code=404, detail="Assignment not found")
+    
+    # Teachers may only delete assignments of courses they teach a section of
+    if current_user.role == Role.teacher:
+        section = session.exec(
+            select(Section).where(
+                Section.course_id == assignment.course_id,
+                Section.teacher_id == current_user.id
+            )
+        ).first()
+        if not section:
+            raise HTTPException(status_code=403, detail="Not authorized for this course")
+    
+    gradebook.assignment_removed(session, assignment)
+    session.exec(delete(Submission).where(Submission.assignment_id == assignment_id))
+    session.delete(assignment)
+    session.commit()
+    return {"ok": True}
+
 # --- Submissions ---
 
 @router.post("/{assignment_id}/submit", response_model=Submission)
@@ -118,7 +151,7 @@ async def submit_assignment(
 def get_submissions(
     assignment_id: int,
     current_user: User = Depends(get_current_user),
-    session: Session = Depends(get_session)
+    session: Session = Depends(get_routed_session)
 ):
     if current_user.role not in [Role.teacher, Role.admin]:
         raise HTTPException(status_code=403, detail="Not authorized")
@@ -166,6 +199,10 @@ def grade_submission(
     submission.grade = grade_data.grade
     submission.feedback = grade_data.feedback
     session.add(submission)
+    # Keep the materialized gradebook in the same transaction as the grade
+    assignment = session.get(Assignment, submission.assignment_id)
+    gradebook.record_grade(session, assignment.course_id, submission.student_id, assignment.id, submission.grade)
+    session.execute(grade_stats.mark_assignment_graded(assignment.id))
     session.commit()
     session.refresh(submission)
     return submission
@@ -174,7 +211,7 @@ def grade_submission(
 @router.get("/my-submissions", response_model=List[Submission])
 def get_my_submissions(
     current_user: User = Depends(get_current_user),
-    session: Session = Depends(get_session)
+    session: Session = Depends(get_routed_session)
 ):
     submissions = session.exec(select(Submission).where(Submission.student_id == current_user.id)).all()
     return submissions
@@ -183,7 +220,7 @@ def get_my_submissions(
 def get_my_submission_for_assignment(
     assignment_id: int,
     current_user: User = Depends(get_current_user),
-    session: Session = Depends(get_session)
+    session: Session = Depends(get_routed_session)
 ):
     """Get current user's submission for a specific assignment"""
     submission = session.exec(
@@ -1,9 +1,10 @@
 from typing import List
 from datetime import datetime
 from fastapi import APIRouter, Depends, HTTPException
-from sqlmodel import Session, select
+from sqlmodel import Session, select, delete
+from sqlmodel.ext.asyncio.session import AsyncSession
 from pydantic import BaseModel
-from database import get_session
+from database import get_session, get_async_session, get_routed_session
 from models import (
     User, Role, Section, Enrollment, Attendance, AttendanceStatus, 
     AttendanceCreate, AttendanceMarkRequest
@@ -16,7 +17,7 @@ router = APIRouter(
 )
 
 # Teacher Dependency
-def get_current_teacher(current_user: User = Depends(get_current_user)):
+async def get_current_teacher(current_user: User = Depends(get_current_user)):
     if current_user.role not in [Role.teacher, Role.admin]:
         raise HTTPException(status_code=403, detail="Not authorized - Teachers only")
     return current_user
@@ -47,7 +48,7 @@ class SectionInfo(BaseModel):
 @router.get("/my-sections", response_model=List[SectionInfo])
 def get_teacher_sections(
     current_user: User = Depends(get_current_teacher),
-    session: Session = Depends(get_session)
+    session: Session = Depends(get_routed_session)
 ):
     """Get all sections assigned to the current teacher"""
     sections = session.exec(
@@ -70,7 +71,7 @@ def get_teacher_sections(
 def get_section_students(
     section_id: int,
     current_user: User = Depends(get_current_teacher),
-    session: Session = Depends(get_session)
+    session: Session = Depends(get_routed_session)
 ):
     """Get all students enrolled in a section"""
     section = session.get(Section, section_id)
@@ -99,14 +100,14 @@ def get_section_students(
 
 # --- Mark Attendance ---
 @router.post("/sections/{section_id}/mark")
-def mark_attendance(
+async def mark_attendance(
     section_id: int,
     request: AttendanceMarkRequest,
     current_user: User = Depends(get_current_teacher),
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_async_session)
 ):
     """Mark attendance for students in a section"""
-    section = session.get(Section, section_id)
+    section = await session.get(Section, section_id)
     if not section:
         raise HTTPException(status_code=404, detail="Section not found")
     
@@ -121,28 +122,26 @@ def mark_attendance(
         raise HTTPException(status_code=400, detail="Invalid date format")
     
     # Delete existing attendance for this date/section (to allow updates)
-    existing = session.exec(
-        select(Attendance)
+    await session.exec(
+        delete(Attendance)
         .where(Attendance.section_id == section_id)
         .where(Attendance.date == attendance_date)
-    ).all()
-    for record in existing:
-        session.delete(record)
+    )
     
     # Create new attendance records
-    created = []
-    for record in request.records:
-        attendance = Attendance(
+    created = [
+        Attendance(
             section_id=section_id,
             student_id=record.student_id,
             date=attendance_date,
             status=record.status,
             marked_by=current_user.id
         )
-        session.add(attendance)
-        created.append(attendance)
+        for record in request.records
+    ]
+    session.add_all(created)
     
-    session.commit()
+    await session.commit()
     
     return {"message": f"Attendance marked for {len(created)} students", "count": len(created)}
 
@@ -153,7 +152,7 @@ def get_attendance_records(
     section_id: int,
     date: str = None,
     current_user: User = Depends(get_current_teacher),
-    session: Session = Depends(get_session)
+    session: Session = Depends(get_routed_session)
 ):
     """Get attendance records for a section, optionally filtered by date"""
     section = session.get(Section, section_id)
@@ -195,7 +194,7 @@ def get_student_attendance(
     student_id: int,
     section_id: int = None,
     current_user: User = Depends(get_current_user),
-    session: Session = Depends(get_session)
+    session: Session = Depends(get_routed_session)
 ):
     """Get attendance summary for a student"""
     # Students can view their own, teachers/admins can view any
@@ -228,7 +227,7 @@ def get_student_attendance(
 @router.get("/my-enrollments")
 def get_student_enrollments(
     current_user: User = Depends(get_current_user),
-    session: Session = Depends(get_session)
+    session: Session = Depends(get_routed_session)
 ):
     """Get all sections the current student is enrolled in"""
     enrollments = session.exec(
@@ -253,7 +252,7 @@ def get_student_enrollments(
 def get_my_attendance_records(
     section_id: int = None,
     current_user: User = Depends(get_current_user),
-    session: Session = Depends(get_session)
+    session: Session = Depends(get_routed_session)
 ):
     """Get attendance records for the current student"""
     query = select(Attendance).where(Attendance.student_id == current_user.id)
@@ -320,7 +319,7 @@ def get_attendance_report(
     start_date: str = None,
     end_date: str = None,
     current_user: User = Depends(get_current_teacher),
-    session: Session = Depends(get_session)
+    session: Session = Depends(get_routed_session)
 ):
     """Get comprehensive attendance report for a section"""
     # Verify section exists and teacher owns it
@@ -1,35 +1,49 @@
-from datetime import timedelta
-from typing import Annotated
+from typing import Annotated, Optional
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
+from jose import JWTError
+from pydantic import BaseModel
 from sqlmodel import Session, select
-from database import get_session
+from sqlmodel.ext.asyncio.session import AsyncSession
+from database import get_session, get_async_session
 from models import User, UserCreate, Role
 from auth import (
-    ACCESS_TOKEN_EXPIRE_MINUTES,
-    create_access_token,
-    get_password_hash,
-    verify_password,
+    oauth2_scheme,
+    create_token_pair,
+    principal_stamp,
+    decode_access_token,
+    revoke_token,
+    get_password_hash_async,
+    verify_and_update_password_async,
+    invalidate_cached_user,
     get_current_user,
 )
+from services.token_revocation import revocation_store
 
 router = APIRouter(
     prefix="/auth",
     tags=["auth"],
 )
 
+# Request models
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+class LogoutRequest(BaseModel):
+    refresh_token: Optional[str] = None
+
 @router.get("/me", response_model=User)
 def get_current_user_profile(current_user: User = Depends(get_current_user)):
     return current_user
 
 @router.post("/signup", response_model=User)
-def signup(user: UserCreate, session: Session = Depends(get_session)):
+async def signup(user: UserCreate, session: AsyncSession = Depends(get_async_session)):
     statement = select(User).where(User.email == user.email)
-    existing_user = session.exec(statement).first()
+    existing_user = (await session.exec(statement)).first()
     if existing_user:
         raise HTTPException(status_code=400, detail="Email already registered")
     
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await get_password_hash_async(user.password)
     # Correctly mapping UserCreate to User, ensuring role is handle if missing
     db_user = User(
         email=user.email,
@@ -39,25 +53,83 @@ def signup(user: UserCreate, session: Session = Depends(get_session)):
         program_id=user.program_id
     )
     session.add(db_user)
-    session.commit()
-    session.refresh(db_user)
+    await session.commit()
+    await session.refresh(db_user)
     return db_user
 
 @router.post("/token")
 async def login_for_access_token(
     form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_async_session)
 ):
     statement = select(User).where(User.email == form_data.username)
-    user = session.exec(statement).first()
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    user = (await session.exec(statement)).first()
+    is_valid, new_hash = (False, None)
+    if user:
+        is_valid, new_hash = await verify_and_update_password_async(form_data.password, user.hashed_password)
+    if not is_valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": user.email, "role": user.role}, expires_delta=access_token_expires
+    
+    # Transparently upgrade hashes created with an older cost setting
+    if new_hash:
+        user.hashed_password = new_hash
+        session.add(user)
+        await session.commit()
+        await session.refresh(user)
+        invalidate_cached_user(user.id, user.email)
+    return create_token_pair(user)
+
+@router.post("/refresh")
+def refresh_access_token(
+    request: RefreshRequest,
+    session: Session = Depends(get_session)
+):
+    """
+    Exchange a refresh token for a new access/refresh pair.
+    The presented refresh token is revoked, so each one works only once.
+    """
+    invalid_token = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid or expired refresh token",
+        headers={"WWW-Authenticate": "Bearer"},
     )
-    return {"access_token": access_token, "token_type": "bearer"}
+    try:
+        payload = decode_access_token(request.refresh_token)
+    except JWTError:
+        raise invalid_token
+    if payload.get("type") != "refresh" or payload.get("jti") is None:
+        raise invalid_token
+    if revocation_store.is_revoked(session, payload["jti"]):
+        raise invalid_token
+    
+    user = session.exec(select(User).where(User.email == payload.get("sub"))).first()
+    if not user or not user.is_active:
+        raise invalid_token
+    if payload.get("ver") not in (None, principal_stamp(user.role, user.is_active, user.hashed_password)):
+        # Password or role changed since this refresh token was issued
+        raise invalid_token
+    
+    revoke_token(session, payload, user.id)
+    return create_token_pair(user)
+
+@router.post("/logout")
+def logout(
+    token: Annotated[str, Depends(oauth2_scheme)],
+    request: Optional[LogoutRequest] = None,
+    current_user: User = Depends(get_current_user),
+    session: Session = Depends(get_session)
+):
+    """Revoke the current access token and, if given, its refresh token"""
+    revoke_token(session, decode_access_token(token), current_user.id)
+    if request and request.refresh_token:
+        try:
+            payload = decode_access_token(request.refresh_token)
+        except JWTError:
+            payload = None
+        if payload and payload.get("type") == "refresh" and payload.get("sub") == current_user.email:
+            revoke_token(session, payload, current_user.id)
+    return {"message": "Logged out"}
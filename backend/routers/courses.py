@@ -2,10 +2,11 @@ from typing import List, Optional
 from fastapi import APIRouter, Depends, HTTPException
 from sqlmodel import Session, select
 from pydantic import BaseModel
-from database import get_session
+from database import get_session, get_routed_session
 from models import Course, CourseCreate, User, Role, Enrollment, Section, Lesson, LessonCreate, Semester, Department, CourseMaterial
 from datetime import datetime
 from auth import get_current_user
+from services import gradebook
 import shutil
 import os
 from fastapi import UploadFile, File
@@ -16,12 +17,12 @@ router = APIRouter(
 )
 
 @router.get("/", response_model=List[Course])
-def read_courses(skip: int = 0, limit: int = 100, session: Session = Depends(get_session)):
+def read_courses(skip: int = 0, limit: int = 100, session: Session = Depends(get_routed_session)):
     courses = session.exec(select(Course).offset(skip).limit(limit)).all()
     return courses
 
 @router.get("/{course_id}", response_model=Course)
-def read_course(course_id: int, session: Session = Depends(get_session)):
+def read_course(course_id: int, session: Session = Depends(get_routed_session)):
     course = session.get(Course, course_id)
     if not course:
         raise HTTPException(status_code=404, detail="Course not found")
@@ -113,7 +114,7 @@ class CourseDetailResponse(BaseModel):
 def get_course_details(
     course_id: int,
     current_user: User = Depends(get_current_user),
-    session: Session = Depends(get_session)
+    session: Session = Depends(get_routed_session)
 ):
     course = session.get(Course, course_id)
     if not course:
@@ -242,6 +243,7 @@ def enroll_in_course(
 
     enrollment = Enrollment(student_id=current_user.id, section_id=section.id)
     session.add(enrollment)
+    gradebook.get_entry(session, course_id, current_user.id)
     session.commit()
     return {"ok": True}
 
@@ -293,7 +295,7 @@ def upload_course_material(
 @router.get("/{course_id}/materials", response_model=List[CourseMaterial])
 def get_course_materials(
     course_id: int,
-    session: Session = Depends(get_session),
+    session: Session = Depends(get_routed_session),
     current_user: User = Depends(get_current_user)
 ):
     # Check if course exists
@@ -1,12 +1,12 @@
 from typing import List
 from fastapi import APIRouter, Depends, HTTPException
 from sqlmodel import Session, select
-from database import get_session
+from database import get_session, get_routed_session
 from models import (
     User, Role, DiscussionThread, ThreadReply,
     DiscussionThreadCreate, ThreadReplyCreate
 )
-from auth import get_current_user
+from auth import get_current_user, get_current_principal, Principal
 
 router = APIRouter(
     prefix="/discussions",
@@ -38,8 +38,8 @@ def create_thread(
 @router.get("/course/{course_id}")
 def get_course_threads(
     course_id: int,
-    current_user: User = Depends(get_current_user),
-    session: Session = Depends(get_session)
+    current_user: Principal = Depends(get_current_principal),
+    session: Session = Depends(get_routed_session)
 ):
     """Get all discussion threads for a course"""
     threads = session.exec(
@@ -68,8 +68,8 @@ def get_course_threads(
 @router.get("/{thread_id}")
 def get_thread(
     thread_id: int,
-    current_user: User = Depends(get_current_user),
-    session: Session = Depends(get_session)
+    current_user: Principal = Depends(get_current_principal),
+    session: Session = Depends(get_routed_session)
 ):
     """Get a thread with all its replies"""
     thread = session.get(DiscussionThread, thread_id)
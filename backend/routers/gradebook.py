@@ -1,10 +1,15 @@
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException
-from sqlmodel import Session, select
+import json
+import re
+from typing import Dict, List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy import and_
+from sqlmodel import Session, select, delete
 from pydantic import BaseModel
-from database import get_session
-from models import User, Role, Course, Section, Enrollment, Assignment, Submission
+from database import get_session, get_routed_session, select_engine
+from models import User, Role, Course, Section, Semester, Enrollment, Assignment, GradebookEntry, GradeCategory, GradeWeight
 from auth import get_current_user
+from services import export, grade_stats, grading
 
 router = APIRouter(
     prefix="/gradebook",
@@ -30,16 +35,8 @@ class GradebookResponse(BaseModel):
     students: List[StudentGrade]
 
 
-@router.get("/course/{course_id}", response_model=GradebookResponse)
-def get_course_gradebook(
-    course_id: int,
-    current_user: User = Depends(get_current_user),
-    session: Session = Depends(get_session)
-):
-    """
-    Get gradebook for a course showing all students and their grades
-    Teacher and Admin only
-    """
+def _get_authorized_course(course_id: int, current_user: User, session: Session) -> Course:
+    """The course, if the caller is an admin or teaches a section of it"""
     # Check authorization
     if current_user.role not in [Role.teacher, Role.admin]:
         raise HTTPException(status_code=403, detail="Not authorized")
@@ -60,72 +57,63 @@ def get_course_gradebook(
         
         if not section:
             raise HTTPException(status_code=403, detail="Not authorized for this course")
-    
-    # Get all assignments for this course
-    assignments = session.exec(
+    return course
+
+
+def _course_assignments(session: Session, course_id: int) -> List[Assignment]:
+    return session.exec(
         select(Assignment).where(Assignment.course_id == course_id).order_by(Assignment.due_date)
     ).all()
+
+
+@router.get("/course/{course_id}", response_model=GradebookResponse)
+def get_course_gradebook(
+    course_id: int,
+    current_user: User = Depends(get_current_user),
+    session: Session = Depends(get_routed_session)
+):
+    """
+    Get gradebook for a course showing all students and their grades
+    Teacher and Admin only
+    """
+    course = _get_authorized_course(course_id, current_user, session)
+    
+    # Get all assignments for this course
+    assignments = _course_assignments(session, course_id)
     
     assignment_list = [
         {"id": a.id, "title": a.title, "max_points": a.max_points}
         for a in assignments
     ]
     
-    # Get all enrolled students (from all sections of this course)
-    enrollments = session.exec(
-        select(Enrollment)
-        .join(Section)
+    # Enrolled students with their materialized gradebook row (kept current on
+    # every grade change, see services/gradebook.py), in one indexed query
+    rows = session.exec(
+        select(User.id, User.full_name, User.email, GradebookEntry)
+        .join(Enrollment, Enrollment.student_id == User.id)
+        .join(Section, Section.id == Enrollment.section_id)
+        .outerjoin(GradebookEntry, and_(
+            GradebookEntry.course_id == course_id,
+            GradebookEntry.student_id == User.id,
+        ))
         .where(Section.course_id == course_id)
+        .distinct()
+        .order_by(User.id)
     ).all()
     
-    # Get unique students
-    student_ids = list(set([e.student_id for e in enrollments]))
+    course_max_points = float(sum(a.max_points for a in assignments))
     students_data = []
     
-    for student_id in student_ids:
-        student = session.get(User, student_id)
-        if not student:
-            continue
-        
-        # Get all submissions for this student in this course
-        submissions = session.exec(
-            select(Submission)
-            .join(Assignment)
-            .where(
-                Submission.student_id == student_id,
-                Assignment.course_id == course_id
-            )
-        ).all()
-        
-        # Create grades dict
-        grades_dict = {}
-        total_points = 0.0
-        max_points = 0.0
-        
-        for assignment in assignments:
-            submission = next(
-                (s for s in submissions if s.assignment_id == assignment.id),
-                None
-            )
-            
-            if submission and submission.grade is not None:
-                grades_dict[assignment.id] = submission.grade
-                total_points += submission.grade
-            else:
-                grades_dict[assignment.id] = None
-            
-            max_points += assignment.max_points
-        
-        percentage = (total_points / max_points * 100) if max_points > 0 else 0
-        
+    for student_id, full_name, email, entry in rows:
+        stored = json.loads(entry.grades) if entry else {}
         students_data.append(StudentGrade(
-            student_id=student.id,
-            student_name=student.full_name,
-            student_email=student.email,
-            grades=grades_dict,
-            total_points=total_points,
-            max_points=max_points,
-            percentage=round(percentage, 2)
+            student_id=student_id,
+            student_name=full_name,
+            student_email=email,
+            grades={a.id: stored.get(str(a.id)) for a in assignments},
+            total_points=entry.total_points if entry else 0.0,
+            max_points=entry.max_points if entry else course_max_points,
+            percentage=entry.percentage if entry else 0
         ))
     
     return GradebookResponse(
@@ -134,3 +122,249 @@ def get_course_gradebook(
         assignments=assignment_list,
         students=students_data
     )
+
+
+# --- Final grades ---
+
+class FinalGrade(BaseModel):
+    student_id: int
+    student_name: str
+    categories: Dict[str, float]  # category -> percentage
+    percentage: float
+    letter: str
+    gpa_point: float
+
+
+class FinalGradesResponse(BaseModel):
+    course_id: int
+    weights: Dict[str, float]
+    students: List[FinalGrade]
+
+
+def _final_grades_response(session: Session, course_id: int, results: List[dict]) -> FinalGradesResponse:
+    names = dict(session.exec(
+        select(User.id, User.full_name).where(User.id.in_([r["student_id"] for r in results]))
+    ).all()) if results else {}
+    return FinalGradesResponse(
+        course_id=course_id,
+        weights={c.value: w for c, w in grading.course_weights(session, course_id).items()},
+        students=[FinalGrade(student_name=names.get(r["student_id"], "Unknown"), **r) for r in results],
+    )
+
+
+@router.get("/course/{course_id}/weights")
+def get_grade_weights(
+    course_id: int,
+    current_user: User = Depends(get_current_user),
+    session: Session = Depends(get_routed_session)
+):
+    """Category weights used for final grades (equal when none are set)"""
+    _get_authorized_course(course_id, current_user, session)
+    return {c.value: w for c, w in grading.course_weights(session, course_id).items()}
+
+
+@router.put("/course/{course_id}/weights")
+def set_grade_weights(
+    course_id: int,
+    weights: Dict[GradeCategory, float],
+    current_user: User = Depends(get_current_user),
+    session: Session = Depends(get_session)
+):
+    """Replace the course's category weights, e.g. {"assignment": 60, "quiz": 40}"""
+    _get_authorized_course(course_id, current_user, session)
+    if any(w < 0 for w in weights.values()) or sum(weights.values()) <= 0:
+        raise HTTPException(status_code=400, detail="Weights must be non-negative and not all zero")
+    
+    session.exec(delete(GradeWeight).where(GradeWeight.course_id == course_id))
+    session.add_all([GradeWeight(course_id=course_id, category=c, weight=w) for c, w in weights.items()])
+    session.commit()
+    return {c.value: w for c, w in weights.items()}
+
+
+@router.get("/course/{course_id}/final-grades", response_model=FinalGradesResponse)
+def get_final_grades(
+    course_id: int,
+    current_user: User = Depends(get_current_user),
+    session: Session = Depends(get_routed_session)
+):
+    """Weighted final grades for every enrolled student (preview, nothing is saved)"""
+    _get_authorized_course(course_id, current_user, session)
+    return _final_grades_response(session, course_id, grading.compute_course_grades(session, course_id))
+
+
+@router.post("/course/{course_id}/final-grades", response_model=FinalGradesResponse)
+def finalize_grades(
+    course_id: int,
+    current_user: User = Depends(get_current_user),
+    session: Session = Depends(get_session)
+):
+    """Compute final grades and record each student's letter on their enrollment"""
+    _get_authorized_course(course_id, current_user, session)
+    return _final_grades_response(session, course_id, grading.finalize_course_grades(session, course_id))
+
+
+# --- Grade statistics ---
+
+class HistogramBin(BaseModel):
+    lower: float  # percentage of max_points
+    upper: float
+    count: int
+
+
+class ItemStats(BaseModel):
+    id: int
+    title: str
+    max_points: float
+    count: int
+    mean: Optional[float]
+    median: Optional[float]
+    std: Optional[float]
+    min: Optional[float]
+    max: Optional[float]
+    percentiles: Dict[str, Optional[float]]  # "p25" -> value
+    histogram: List[HistogramBin]
+
+
+class CourseStatsResponse(BaseModel):
+    course_id: int
+    assignments: List[ItemStats]  # points
+    quizzes: List[ItemStats]  # best attempt per student, percentage
+
+
+@router.get("/course/{course_id}/stats", response_model=CourseStatsResponse)
+def get_course_stats(
+    course_id: int,
+    current_user: User = Depends(get_current_user),
+    session: Session = Depends(get_routed_session),
+    # Cached per item, so built from the primary
+    primary: Session = Depends(get_session)
+):
+    """Grade distribution for each assignment and quiz (cached per item)"""
+    _get_authorized_course(course_id, current_user, session)
+    return CourseStatsResponse(course_id=course_id, **grade_stats.course_stats(primary, course_id))
+
+
+# --- Exports ---
+
+EXPORT_FORMATS = {"csv": export.CSV_MEDIA_TYPE, "xlsx": export.XLSX_MEDIA_TYPE}
+# Rows fetched per round trip; on Postgres this is a server-side cursor
+EXPORT_BATCH_SIZE = 1000
+
+
+def _export_header(assignments: List[Assignment]) -> list:
+    return (
+        ["Student ID", "Student Name", "Email"]
+        + [f"{a.title} (/{a.max_points})" for a in assignments]
+        + ["Total Points", "Max Points", "Percentage"]
+    )
+
+
+def _export_rows(session: Session, course_id: int, assignments: List[Assignment]):
+    """Gradebook rows for a course, streamed from the materialized entries"""
+    course_max_points = float(sum(a.max_points for a in assignments))
+    result = session.exec(
+        select(
+            User.id, User.full_name, User.email,
+            GradebookEntry.grades, GradebookEntry.total_points, GradebookEntry.max_points, GradebookEntry.percentage,
+        )
+        .join(Enrollment, Enrollment.student_id == User.id)
+        .join(Section, Section.id == Enrollment.section_id)
+        .outerjoin(GradebookEntry, and_(
+            GradebookEntry.course_id == course_id,
+            GradebookEntry.student_id == User.id,
+        ))
+        .where(Section.course_id == course_id)
+        .distinct()
+        .order_by(User.id)
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+    )
+    for student_id, full_name, email, grades, total_points, max_points, percentage in result:
+        stored = json.loads(grades) if grades else {}
+        yield (
+            [student_id, full_name, email]
+            + [stored.get(str(a.id)) for a in assignments]
+            + [total_points or 0.0, course_max_points if max_points is None else max_points, percentage or 0]
+        )
+
+
+def _render(format: str, header: list, rows, sheet_name: str):
+    if format == "xlsx":
+        return export.iter_xlsx(header, rows, sheet_name=sheet_name)
+    return export.iter_csv(header, rows)
+
+
+def _export_filename(course: Course, format: str) -> str:
+    return f"{re.sub(r'[^A-Za-z0-9._-]', '_', course.code)}-gradebook.{format}"
+
+
+@router.get("/course/{course_id}/export")
+def export_course_gradebook(
+    course_id: int,
+    request: Request,
+    format: str = Query("csv", pattern="^(csv|xlsx)$"),
+    current_user: User = Depends(get_current_user),
+    session: Session = Depends(get_routed_session)
+):
+    """
+    Download a course gradebook as CSV or XLSX, streamed row by row
+    Teacher and Admin only
+    """
+    course = _get_authorized_course(course_id, current_user, session)
+    assignments = _course_assignments(session, course_id)
+    header = _export_header(assignments)
+    
+    def generate():
+        # The request's session closes when this endpoint returns, so stream from our own
+        with Session(select_engine(request)) as stream_session:
+            yield from _render(format, header, _export_rows(stream_session, course_id, assignments), course.code)
+    
+    return StreamingResponse(
+        generate(),
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{_export_filename(course, format)}"'},
+    )
+
+
+@router.get("/semester/{semester_id}/export")
+def export_semester_gradebooks(
+    semester_id: int,
+    request: Request,
+    format: str = Query("csv", pattern="^(csv|xlsx)$"),
+    current_user: User = Depends(get_current_user),
+    session: Session = Depends(get_routed_session)
+):
+    """
+    Download the gradebook of every course in a semester as one zip, streamed
+    Admin only
+    """
+    if current_user.role != Role.admin:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    
+    semester = session.get(Semester, semester_id)
+    if not semester:
+        raise HTTPException(status_code=404, detail="Semester not found")
+    
+    courses = session.exec(
+        select(Course)
+        .join(Section, Section.course_id == Course.id)
+        .where(Section.semester_id == semester_id)
+        .distinct()
+        .order_by(Course.code)
+    ).all()
+    
+    def course_files(stream_session: Session):
+        for course in courses:
+            assignments = _course_assignments(stream_session, course.id)
+            rows = _export_rows(stream_session, course.id, assignments)
+            yield _export_filename(course, format), _render(format, _export_header(assignments), rows, course.code)
+    
+    def generate():
+        with Session(select_engine(request)) as stream_session:
+            yield from export.iter_zip(course_files(stream_session))
+    
+    filename = re.sub(r"[^A-Za-z0-9._-]", "_", semester.name)
+    return StreamingResponse(
+        generate(),
+        media_type=export.ZIP_MEDIA_TYPE,
+        headers={"Content-Disposition": f'attachment; filename="{filename}-gradebooks.zip"'},
+    )
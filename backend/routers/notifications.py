@@ -1,9 +1,10 @@
 from typing import List
 from fastapi import APIRouter, Depends, HTTPException
-from sqlmodel import Session, select
-from database import get_session
+from sqlmodel import Session, select, func
+from sqlmodel.ext.asyncio.session import AsyncSession
+from database import get_session, get_async_session, get_routed_session
 from models import User, Notification, NotificationCreate, NotificationType
-from auth import get_current_user
+from auth import get_current_user, get_current_principal, Principal
 
 router = APIRouter(
     prefix="/notifications",
@@ -15,8 +16,8 @@ router = APIRouter(
 def get_my_notifications(
     limit: int = 50,
     unread_only: bool = False,
-    current_user: User = Depends(get_current_user),
-    session: Session = Depends(get_session)
+    current_user: Principal = Depends(get_current_principal),
+    session: Session = Depends(get_routed_session)
 ):
     """Get notifications for current user"""
     query = select(Notification).where(Notification.user_id == current_user.id)
@@ -32,17 +33,17 @@ def get_my_notifications(
 
 
 @router.get("/unread-count")
-def get_unread_count(
-    current_user: User = Depends(get_current_user),
-    session: Session = Depends(get_session)
+async def get_unread_count(
+    current_user: Principal = Depends(get_current_principal),
+    session: AsyncSession = Depends(get_async_session)
 ):
     """Get unread notification count"""
-    count = session.exec(
-        select(Notification)
+    count = (await session.exec(
+        select(func.count(Notification.id))
         .where(Notification.user_id == current_user.id, Notification.is_read == False)
-    ).all()
+    )).one()
     
-    return {"count": len(count)}
+    return {"count": count}
 
 
 @router.post("/{notification_id}/mark-read")
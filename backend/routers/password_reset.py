@@ -3,14 +3,9 @@ from sqlmodel import Session, select
 from pydantic import BaseModel, EmailStr
 from database import get_session
 from models import User, PasswordResetToken
-from auth import get_password_hash
+from auth import get_password_hash, invalidate_cached_user
 from datetime import datetime, timedelta
 import secrets
-import sys
-import os
-
-# Add parent directory to path to import services
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from services.email_service import send_password_reset_email
 
 router = APIRouter(
@@ -131,5 +126,6 @@ def reset_password(
     session.add(user)
     session.add(reset_token)
     session.commit()
+    invalidate_cached_user(user.id, user.email)
     
     return {"message": "Password reset successfully"}
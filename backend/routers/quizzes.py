@@ -1,14 +1,17 @@
-from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import Dict, List
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy import insert, update
 from sqlmodel import Session, select
-from database import get_session
+from sqlmodel.ext.asyncio.session import AsyncSession
+from database import get_session, get_async_session, get_routed_session
 from models import (
-    User, Role, Course, Quiz, Question, QuizAttempt, Answer,
-    QuizCreate, QuestionCreate, QuizSubmission, QuestionType
+    User, Role, Course, Section, Quiz, Question, QuizAttempt, Answer,
+    QuizCreate, QuestionCreate, QuizUpdate, QuestionUpdate, QuizSubmission
 )
-from auth import get_current_user
+from auth import get_current_user, get_current_principal, Principal
 from datetime import datetime
 import json
+from services import autosave, grade_stats, quiz_cache, quiz_timer
 
 router = APIRouter(
     prefix="/quizzes",
@@ -18,6 +21,20 @@ router = APIRouter(
 
 # --- Quiz CRUD ---
 
+def _require_quiz_editor(session: Session, quiz: Quiz, current_user: User):
+    """Admins, the quiz's author and teachers of a section of its course may edit it"""
+    if current_user.role == Role.admin or quiz.created_by == current_user.id:
+        return
+    section = session.exec(
+        select(Section).where(
+            Section.course_id == quiz.course_id,
+            Section.teacher_id == current_user.id
+        )
+    ).first()
+    if not section:
+        raise HTTPException(status_code=403, detail="Not authorized for this course")
+
+
 @router.post("/", response_model=Quiz)
 def create_quiz(
     quiz_data: QuizCreate,
@@ -66,8 +83,8 @@ def create_quiz(
 @router.get("/course/{course_id}")
 def get_course_quizzes(
     course_id: int,
-    current_user: User = Depends(get_current_user),
-    session: Session = Depends(get_session)
+    current_user: Principal = Depends(get_current_principal),
+    session: Session = Depends(get_routed_session)
 ):
     """Get all quizzes for a course"""
     quizzes = session.exec(
@@ -80,46 +97,79 @@ def get_course_quizzes(
 @router.get("/{quiz_id}")
 def get_quiz(
     quiz_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
+    # The primary, not the replica: a compiled quiz is cached, so it must not be built from lagging data
     session: Session = Depends(get_session)
 ):
     """Get quiz details with questions"""
+    compiled = quiz_cache.get_compiled(session, quiz_id)
+    if not compiled:
+        raise HTTPException(status_code=404, detail="Quiz not found")
+    
+    # For students, don't include correct answers
+    body = compiled.student_json if current_user.role == Role.student else compiled.teacher_json
+    return Response(content=body, media_type="application/json")
+
+
+@router.patch("/{quiz_id}", response_model=Quiz)
+def update_quiz(
+    quiz_id: int,
+    quiz_data: QuizUpdate,
+    current_user: User = Depends(get_current_user),
+    session: Session = Depends(get_session)
+):
+    """Update quiz settings (Teacher/Admin only)"""
+    if current_user.role not in [Role.teacher, Role.admin]:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    
     quiz = session.get(Quiz, quiz_id)
     if not quiz:
         raise HTTPException(status_code=404, detail="Quiz not found")
+    _require_quiz_editor(session, quiz, current_user)
     
-    # Get questions
-    questions = session.exec(
-        select(Question).where(Question.quiz_id == quiz_id).order_by(Question.order)
-    ).all()
+    update_data = quiz_data.model_dump(exclude_unset=True)
+    for key in ("available_from", "available_until"):
+        if key in update_data:
+            update_data[key] = datetime.fromisoformat(update_data[key]) if update_data[key] else None
+    for key, value in update_data.items():
+        setattr(quiz, key, value)
     
-    # For students, don't include correct answers
-    if current_user.role == Role.student:
-        questions_data = []
-        for q in questions:
-            q_dict = q.model_dump()
-            q_dict.pop('correct_answer', None)
-            if q.options:
-                q_dict['options'] = json.loads(q.options)
-            questions_data.append(q_dict)
-        
-        return {
-            **quiz.model_dump(),
-            "questions": questions_data
-        }
+    session.add(quiz)
+    quiz_cache.bump_version(session, quiz_id)
+    session.commit()
+    session.refresh(quiz)
+    quiz_cache.invalidate(quiz_id)
+    return quiz
+
+
+@router.patch("/questions/{question_id}", response_model=Question)
+def update_question(
+    question_id: int,
+    question_data: QuestionUpdate,
+    current_user: User = Depends(get_current_user),
+    session: Session = Depends(get_session)
+):
+    """Edit a question (Teacher/Admin only)"""
+    if current_user.role not in [Role.teacher, Role.admin]:
+        raise HTTPException(status_code=403, detail="Not authorized")
     
-    # For teachers/admins, include everything
-    questions_data = []
-    for q in questions:
-        q_dict = q.model_dump()
-        if q.options:
-            q_dict['options'] = json.loads(q.options)
-        questions_data.append(q_dict)
+    question = session.get(Question, question_id)
+    if not question:
+        raise HTTPException(status_code=404, detail="Question not found")
+    _require_quiz_editor(session, session.get(Quiz, question.quiz_id), current_user)
     
-    return {
-        **quiz.model_dump(),
-        "questions": questions_data
-    }
+    update_data = question_data.model_dump(exclude_unset=True)
+    if "options" in update_data:
+        update_data["options"] = json.dumps(update_data["options"]) if update_data["options"] else None
+    for key, value in update_data.items():
+        setattr(question, key, value)
+    
+    session.add(question)
+    quiz_cache.bump_version(session, question.quiz_id)
+    session.commit()
+    session.refresh(question)
+    quiz_cache.invalidate(question.quiz_id)
+    return question
 
 
 @router.delete("/{quiz_id}")
@@ -138,6 +188,7 @@ def delete_quiz(
     
     session.delete(quiz)
     session.commit()
+    quiz_cache.invalidate(quiz_id)
     
     return {"message": "Quiz deleted successfully"}
 
@@ -183,7 +234,9 @@ def start_quiz_attempt(
     attempt = QuizAttempt(
         quiz_id=quiz_id,
         student_id=current_user.id,
-        attempt_number=len(existing_attempts) + 1
+        attempt_number=len(existing_attempts) + 1,
+        started_at=now,
+        expires_at=quiz_timer.deadline(quiz.time_limit, now)
     )
     session.add(attempt)
     session.commit()
@@ -193,19 +246,19 @@ def start_quiz_attempt(
 
 
 @router.post("/{quiz_id}/submit/{attempt_id}")
-def submit_quiz(
+async def submit_quiz(
     quiz_id: int,
     attempt_id: int,
     submission: QuizSubmission,
     current_user: User = Depends(get_current_user),
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_async_session)
 ):
     """Submit quiz answers and get auto-graded results"""
     if current_user.role != Role.student:
         raise HTTPException(status_code=403, detail="Only students can submit quizzes")
     
     # Get attempt
-    attempt = session.get(QuizAttempt, attempt_id)
+    attempt = await session.get(QuizAttempt, attempt_id)
     if not attempt:
         raise HTTPException(status_code=404, detail="Attempt not found")
     
@@ -215,69 +268,114 @@ def submit_quiz(
     if attempt.submitted_at:
         raise HTTPException(status_code=400, detail="Quiz already submitted")
     
-    # Get quiz and questions
-    quiz = session.get(Quiz, quiz_id)
-    questions = session.exec(
-        select(Question).where(Question.quiz_id == quiz_id)
-    ).all()
+    # Past the time limit: the auto-submit sweep closes the attempt
+    if quiz_timer.is_late(attempt.expires_at):
+        raise HTTPException(status_code=400, detail="Time limit exceeded")
     
-    # Auto-grade
-    total_score = 0.0
-    max_score = 0.0
+    if attempt.quiz_id != quiz_id:
+        raise HTTPException(status_code=400, detail="Attempt does not belong to this quiz")
     
-    for question in questions:
-        max_score += question.points
-        
-        # Get student's answer
-        answer_text = submission.answers.get(str(question.id), "")
-        
-        # Check correctness
-        is_correct = False
-        points_earned = 0.0
-        
-        if question.question_type == QuestionType.true_false:
-            is_correct = answer_text.lower() == question.correct_answer.lower()
-        elif question.question_type == QuestionType.mcq:
-            is_correct = answer_text == question.correct_answer
-        
-        if is_correct:
-            points_earned = question.points
-            total_score += points_earned
-        
-        # Save answer
-        answer = Answer(
-            attempt_id=attempt_id,
-            question_id=question.id,
-            answer_text=answer_text,
-            is_correct=is_correct,
-            points_earned=points_earned
+    # Grade against the cached answer key in one pass; autosaved answers fill in
+    # anything the submission leaves out
+    compiled = await quiz_cache.get_compiled_async(session, quiz_id)
+    if not compiled:
+        raise HTTPException(status_code=404, detail="Quiz not found")
+    key = compiled.key
+    drafts = (await autosave.drafts_for_async(session, [attempt_id])).get(attempt_id, {})
+    answer_rows, total_score = key.grade(attempt_id, {**drafts, **submission.answers})
+    percentage = key.percentage(total_score)
+    passing_score = compiled.quiz["passing_score"]
+    
+    # Close the attempt only if it is still open, so concurrent submits can't both record answers
+    closed = await session.execute(
+        update(QuizAttempt)
+        .where(QuizAttempt.id == attempt_id, QuizAttempt.submitted_at == None)
+        .values(
+            submitted_at=datetime.utcnow(),
+            score=total_score,
+            max_score=key.max_score,
+            percentage=percentage,
         )
-        session.add(answer)
-    
-    # Update attempt
-    attempt.submitted_at = datetime.utcnow()
-    attempt.score = total_score
-    attempt.max_score = max_score
-    attempt.percentage = (total_score / max_score * 100) if max_score > 0 else 0
-    
-    session.add(attempt)
-    session.commit()
-    session.refresh(attempt)
+    )
+    if closed.rowcount == 0:
+        await session.rollback()
+        raise HTTPException(status_code=400, detail="Quiz already submitted")
+    if answer_rows:
+        await session.execute(insert(Answer), answer_rows)
+    if drafts:
+        await session.execute(autosave.delete_drafts([attempt_id]))
+    # Last, so the quiz row is locked only briefly while a class submits together
+    await session.execute(grade_stats.mark_quizzes_graded([quiz_id]))
+    await session.commit()
+    autosave.discard([attempt_id])
     
     return {
-        "attempt_id": attempt.id,
-        "score": attempt.score,
-        "max_score": attempt.max_score,
-        "percentage": attempt.percentage,
-        "passed": attempt.percentage >= quiz.passing_score if quiz.passing_score else None
+        "attempt_id": attempt_id,
+        "score": total_score,
+        "max_score": key.max_score,
+        "percentage": percentage,
+        "passed": percentage >= passing_score if passing_score else None
     }
 
 
+@router.post("/attempt/{attempt_id}/autosave")
+def autosave_answers(
+    attempt_id: int,
+    submission: QuizSubmission,
+    current_user: Principal = Depends(get_current_principal),
+    session: Session = Depends(get_session)
+):
+    """Save answers of an attempt in progress; they reach the database within a few seconds"""
+    if current_user.role != Role.student:
+        raise HTTPException(status_code=403, detail="Only students can save answers")
+    
+    attempt = autosave.open_attempt(session, attempt_id)
+    if not attempt:
+        raise HTTPException(status_code=404, detail="No open attempt with this id")
+    student_id, quiz_id, expires_at = attempt
+    if student_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not your attempt")
+    if quiz_timer.is_late(expires_at):
+        raise HTTPException(status_code=400, detail="Time limit exceeded")
+    
+    # Keep only answers to this quiz's questions
+    compiled = quiz_cache.get_compiled(session, quiz_id)
+    if not compiled:
+        # Deleted since the open attempt was cached
+        autosave.discard([attempt_id])
+        raise HTTPException(status_code=404, detail="Quiz not found")
+    answers = {}
+    for question_id, answer_text in submission.answers.items():
+        if not str(question_id).isdigit() or int(question_id) not in compiled.questions:
+            continue
+        answer_text = "" if answer_text is None else str(answer_text)
+        if len(answer_text) > autosave.AUTOSAVE_MAX_ANSWER_LENGTH:
+            raise HTTPException(status_code=400, detail="Answer too long")
+        answers[int(question_id)] = answer_text
+    
+    return {"saved": autosave.buffer(attempt_id, answers)}
+
+
+@router.get("/attempt/{attempt_id}/draft")
+def get_attempt_draft(
+    attempt_id: int,
+    current_user: Principal = Depends(get_current_principal),
+    session: Session = Depends(get_session)
+):
+    """Autosaved answers of an open attempt, to restore after a reload"""
+    attempt = autosave.open_attempt(session, attempt_id)
+    if not attempt:
+        raise HTTPException(status_code=404, detail="No open attempt with this id")
+    if attempt[0] != current_user.id:
+        raise HTTPException(status_code=403, detail="Not your attempt")
+    return {"answers": autosave.drafts_for(session, [attempt_id]).get(attempt_id, {})}
+
+
 @router.get("/{quiz_id}/attempts")
 def get_quiz_attempts(
     quiz_id: int,
-    current_user: User = Depends(get_current_user),
-    session: Session = Depends(get_session)
+    current_user: Principal = Depends(get_current_principal),
+    session: Session = Depends(get_routed_session)
 ):
     """Get all attempts for a quiz (student sees own, teacher sees all)"""
     quiz = session.get(Quiz, quiz_id)
@@ -303,46 +401,86 @@ def get_quiz_attempts(
     return attempts
 
 
+def _attempt_results(session: Session, primary: Session, attempt_ids: List[int]) -> Dict[int, dict]:
+    """Attempts with their graded answers from one joined query; question details come
+    from the compiled quiz cache, built from the primary so it never caches replica lag"""
+    rows = session.exec(
+        select(QuizAttempt, Answer)
+        .outerjoin(Answer, Answer.attempt_id == QuizAttempt.id)
+        .where(QuizAttempt.id.in_(attempt_ids))
+        .order_by(QuizAttempt.id, Answer.id)
+    ).all()
+    compiled = {}
+    found = {}
+    for attempt, answer in rows:
+        entry = found.setdefault(attempt.id, {"attempt": attempt, "results": []})
+        if answer is None:
+            continue
+        if attempt.quiz_id not in compiled:
+            compiled[attempt.quiz_id] = quiz_cache.get_compiled(primary, attempt.quiz_id)
+        quiz = compiled[attempt.quiz_id]
+        question = quiz.questions.get(answer.question_id) if quiz else None
+        if question is None:
+            continue
+        result = {
+            "question_id": question["id"],
+            "question_text": question["question_text"],
+            "question_type": question["question_type"],
+            "points": question["points"],
+            "student_answer": answer.answer_text,
+            "correct_answer": question["correct_answer"],
+            "is_correct": answer.is_correct,
+            "points_earned": answer.points_earned
+        }
+        
+        if question["options"]:
+            result["options"] = question["options"]
+        
+        entry["results"].append(result)
+    return found
+
+
 @router.get("/attempt/{attempt_id}/results")
 def get_attempt_results(
     attempt_id: int,
-    current_user: User = Depends(get_current_user),
-    session: Session = Depends(get_session)
+    current_user: Principal = Depends(get_current_principal),
+    session: Session = Depends(get_routed_session),
+    primary: Session = Depends(get_session)
 ):
     """Get detailed results for a specific attempt"""
-    attempt = session.get(QuizAttempt, attempt_id)
-    if not attempt:
+    found = _attempt_results(session, primary, [attempt_id])
+    if attempt_id not in found:
         raise HTTPException(status_code=404, detail="Attempt not found")
     
     # Authorization check
-    if current_user.role == Role.student and attempt.student_id != current_user.id:
+    if current_user.role == Role.student and found[attempt_id]["attempt"].student_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized")
     
-    # Get answers with questions
-    answers = session.exec(
-        select(Answer).where(Answer.attempt_id == attempt_id)
-    ).all()
-    
-    results = []
-    for answer in answers:
-        question = session.get(Question, answer.question_id)
-        result = {
-            "question_id": question.id,
-            "question_text": question.question_text,
-            "question_type": question.question_type,
-            "points": question.points,
-            "student_answer": answer.answer_text,
-            "correct_answer": question.correct_answer,
-            "is_correct": answer.is_correct,
-            "points_earned": answer.points_earned
-        }
-        
-        if question.options:
-            result["options"] = json.loads(question.options)
-        
-        results.append(result)
+    return found[attempt_id]
+
+
+# Most attempts one batch request may ask for
+MAX_RESULTS_BATCH = 500
+
+
+@router.get("/attempts/results")
+def get_attempts_results(
+    attempt_ids: List[int] = Query(...),
+    current_user: Principal = Depends(get_current_principal),
+    session: Session = Depends(get_routed_session),
+    primary: Session = Depends(get_session)
+):
+    """Detailed results for many attempts at once (e.g. a teacher's review screen), in the order asked.
+
+    Ids that do not exist are left out.
+    """
+    if len(attempt_ids) > MAX_RESULTS_BATCH:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_RESULTS_BATCH} attempts per request")
+    
+    found = _attempt_results(session, primary, list(dict.fromkeys(attempt_ids)))
+    if current_user.role == Role.student and any(
+        entry["attempt"].student_id != current_user.id for entry in found.values()
+    ):
+        raise HTTPException(status_code=403, detail="Not authorized")
     
-    return {
-        "attempt": attempt,
-        "results": results
-    }
+    return {"attempts": [found[attempt_id] for attempt_id in dict.fromkeys(attempt_ids) if attempt_id in found]}
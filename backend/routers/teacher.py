@@ -1,6 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlmodel import Session, select, func
-from database import get_session
+from database import get_routed_session
 from models import User, Role, Section, Enrollment, Assignment, Submission, Course
 from auth import get_current_user
 from typing import List, Dict, Any
@@ -20,7 +20,7 @@ def get_current_teacher(current_user: User = Depends(get_current_user)) -> User:
 
 @router.get("/dashboard")
 def get_teacher_dashboard(
-    session: Session = Depends(get_session),
+    session: Session = Depends(get_routed_session),
     teacher: User = Depends(get_current_teacher)
 ) -> Dict[str, Any]:
     """
@@ -122,7 +122,7 @@ def get_teacher_dashboard(
 
 @router.get("/sections")
 def get_teacher_sections(
-    session: Session = Depends(get_session),
+    session: Session = Depends(get_routed_session),
     teacher: User = Depends(get_current_teacher)
 ) -> List[Dict[str, Any]]:
     """Get all sections assigned to the teacher"""
@@ -155,7 +155,7 @@ def get_teacher_sections(
 @router.get("/sections/{section_id}")
 def get_section_details(
     section_id: int,
-    session: Session = Depends(get_session),
+    session: Session = Depends(get_routed_session),
     teacher: User = Depends(get_current_teacher)
 ) -> Dict[str, Any]:
     """Get detailed information about a specific section (teacher must own it)"""
@@ -194,7 +194,7 @@ def get_section_details(
 @router.get("/sections/{section_id}/students")
 def get_section_students(
     section_id: int,
-    session: Session = Depends(get_session),
+    session: Session = Depends(get_routed_session),
     teacher: User = Depends(get_current_teacher)
 ) -> List[Dict[str, Any]]:
     """Get list of enrolled students in a section (teacher must own it)"""
@@ -0,0 +1,126 @@
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from pydantic import BaseModel
+from sqlmodel import Session, select, func
+from database import get_session, get_routed_session
+from models import User, Role, Program, Batch
+from auth import get_current_user
+from services import transcript
+
+router = APIRouter(
+    prefix="/transcripts",
+    tags=["transcripts"],
+)
+
+
+# Response models
+class TranscriptCourse(BaseModel):
+    course_id: int
+    code: str
+    title: str
+    credit_hours: int
+    grade: str
+    gpa_point: Optional[float]
+
+
+class TranscriptSemester(BaseModel):
+    semester_id: int
+    semester_name: str
+    courses: List[TranscriptCourse]
+    credits: int
+    gpa: Optional[float]
+    cgpa: Optional[float]  # cumulative up to and including this semester
+
+
+class Transcript(BaseModel):
+    student_id: int
+    student_name: Optional[str]
+    semesters: List[TranscriptSemester]
+    total_credits: int
+    cgpa: Optional[float]
+
+
+class CohortTranscripts(BaseModel):
+    total: int
+    skip: int
+    limit: int
+    transcripts: List[Transcript]
+
+
+def _require_staff(current_user: User):
+    if current_user.role not in [Role.teacher, Role.admin]:
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+def _cohort_page(session: Session, primary: Session, condition, skip: int, limit: int) -> CohortTranscripts:
+    """One page of a cohort's students by id, with uncached transcripts computed together.
+
+    Transcripts are cached, so they are computed on the primary: a lagging replica
+    read right after finalization would otherwise be cached for the full TTL.
+    """
+    students = select(User.id).where(condition, User.role == Role.student)
+    total = session.exec(select(func.count()).select_from(students.subquery())).one()
+    student_ids = session.exec(students.order_by(User.id).offset(skip).limit(limit)).all()
+    return CohortTranscripts(
+        total=total, skip=skip, limit=limit,
+        transcripts=transcript.get_transcripts(primary, student_ids),
+    )
+
+
+# --- Single student ---
+
+@router.get("/me", response_model=Transcript)
+def get_my_transcript(
+    current_user: User = Depends(get_current_user),
+    primary: Session = Depends(get_session)
+):
+    return transcript.get_transcripts(primary, [current_user.id])[0]
+
+
+@router.get("/student/{student_id}", response_model=Transcript)
+def get_student_transcript(
+    student_id: int,
+    current_user: User = Depends(get_current_user),
+    session: Session = Depends(get_routed_session),
+    # Transcripts are cached, so they are computed from the primary, never a lagging replica
+    primary: Session = Depends(get_session)
+):
+    if current_user.id != student_id:
+        _require_staff(current_user)
+    student = session.get(User, student_id)
+    if not student or student.role != Role.student:
+        raise HTTPException(status_code=404, detail="Student not found")
+    return transcript.get_transcripts(primary, [student_id])[0]
+
+
+# --- Cohorts ---
+
+@router.get("/program/{program_id}", response_model=CohortTranscripts)
+def get_program_transcripts(
+    program_id: int,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    current_user: User = Depends(get_current_user),
+    session: Session = Depends(get_routed_session),
+    primary: Session = Depends(get_session)
+):
+    """Transcripts for every student in a program, paginated by student id"""
+    _require_staff(current_user)
+    if not session.get(Program, program_id):
+        raise HTTPException(status_code=404, detail="Program not found")
+    return _cohort_page(session, primary, User.program_id == program_id, skip, limit)
+
+
+@router.get("/batch/{batch_id}", response_model=CohortTranscripts)
+def get_batch_transcripts(
+    batch_id: int,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    current_user: User = Depends(get_current_user),
+    session: Session = Depends(get_routed_session),
+    primary: Session = Depends(get_session)
+):
+    """Transcripts for every student in a batch, paginated by student id"""
+    _require_staff(current_user)
+    if not session.get(Batch, batch_id):
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return _cohort_page(session, primary, User.batch_id == batch_id, skip, limit)
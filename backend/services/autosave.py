@@ -0,0 +1,167 @@
+import asyncio
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+from decouple import config
+from sqlalchemy import delete
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from models import DraftAnswer, QuizAttempt
+from cache import TTLCache
+import metrics
+
+# Write-behind autosave for quiz attempts in progress. Saves go into an in-memory
+# buffer keyed by attempt and question, so repeated saves of one answer coalesce.
+# A background task writes the buffer to DraftAnswer with one upsert every
+# AUTOSAVE_FLUSH_SECONDS. submit_quiz and the auto-submit sweep grade from the
+# drafts (flushed rows plus whatever is still buffered in this worker) and delete
+# them. If a worker dies, at most its last flush interval of saves is lost.
+# Once an attempt is submitted elsewhere, a worker still holding it as open learns
+# so at its next flush and answers 404 from then on.
+AUTOSAVE_FLUSH_SECONDS = config("AUTOSAVE_FLUSH_SECONDS", default=3, cast=float)
+AUTOSAVE_MAX_ANSWER_LENGTH = config("AUTOSAVE_MAX_ANSWER_LENGTH", default=10000, cast=int)
+
+logger = logging.getLogger(__name__)
+
+_pending: Dict[int, Dict[int, str]] = {}  # attempt_id -> {question_id: answer_text}
+_flushing: Dict[int, Dict[int, str]] = {}  # taken by the flush in progress, not yet committed
+_lock = threading.Lock()
+
+# Open attempts seen by the autosave endpoint: attempt_id -> (student_id, quiz_id, expires_at)
+open_attempts = TTLCache("open_attempt", maxsize=50000, ttl=60)
+
+
+def open_attempt(session: Session, attempt_id: int) -> Optional[Tuple[int, int, Optional[datetime]]]:
+    """(student_id, quiz_id, expires_at) of an attempt that is not submitted, or None"""
+    cached = open_attempts.get(attempt_id)
+    if cached is None:
+        cached = session.exec(
+            select(QuizAttempt.student_id, QuizAttempt.quiz_id, QuizAttempt.expires_at)
+            .where(QuizAttempt.id == attempt_id, QuizAttempt.submitted_at == None)
+        ).first()
+        if cached is None:
+            return None
+        cached = tuple(cached)
+        open_attempts.set(attempt_id, cached)
+    return cached
+
+def buffer(attempt_id: int, answers: Dict[int, str]) -> int:
+    with _lock:
+        _pending.setdefault(attempt_id, {}).update(answers)
+    metrics.incr("autosave.saves")
+    return len(answers)
+
+def _buffered(attempt_ids: Iterable[int]) -> Dict[int, Dict[str, str]]:
+    with _lock:
+        found = {}
+        for attempt_id in attempt_ids:
+            answers = {**_flushing.get(attempt_id, {}), **_pending.get(attempt_id, {})}
+            if answers:
+                found[attempt_id] = {str(question_id): text for question_id, text in answers.items()}
+        return found
+
+def _merge(rows, attempt_ids: List[int]) -> Dict[int, Dict[str, str]]:
+    drafts = {}
+    for attempt_id, question_id, answer_text in rows:
+        drafts.setdefault(attempt_id, {})[str(question_id)] = answer_text
+    # Buffered saves are newer than anything flushed
+    for attempt_id, answers in _buffered(attempt_ids).items():
+        drafts.setdefault(attempt_id, {}).update(answers)
+    return drafts
+
+def _drafts_query(attempt_ids: List[int]):
+    return select(DraftAnswer.attempt_id, DraftAnswer.question_id, DraftAnswer.answer_text).where(
+        DraftAnswer.attempt_id.in_(attempt_ids)
+    )
+
+def drafts_for(session: Session, attempt_ids: List[int]) -> Dict[int, Dict[str, str]]:
+    """Latest saved answers per attempt, as {str(question_id): answer_text}"""
+    return _merge(session.exec(_drafts_query(attempt_ids)).all(), attempt_ids)
+
+async def drafts_for_async(session: AsyncSession, attempt_ids: List[int]) -> Dict[int, Dict[str, str]]:
+    return _merge((await session.exec(_drafts_query(attempt_ids))).all(), attempt_ids)
+
+def delete_drafts(attempt_ids: List[int]):
+    """Statement removing the drafts of attempts being submitted; run it in the submit transaction"""
+    return delete(DraftAnswer).where(DraftAnswer.attempt_id.in_(attempt_ids))
+
+def discard(attempt_ids: Iterable[int]):
+    """Forget buffered saves of attempts that were just submitted"""
+    with _lock:
+        for attempt_id in attempt_ids:
+            _pending.pop(attempt_id, None)
+            open_attempts.invalidate(attempt_id)
+
+
+# --- Flushing ---
+
+def _upsert(session: Session, rows: List[dict]):
+    dialect = session.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        insert = (postgresql if dialect == "postgresql" else sqlite).insert(DraftAnswer.__table__)
+        session.execute(insert.on_conflict_do_update(
+            index_elements=["attempt_id", "question_id"],
+            set_={"answer_text": insert.excluded.answer_text, "updated_at": insert.excluded.updated_at},
+        ), rows)
+        return
+    # No upsert on this database: replace the rows instead
+    table = DraftAnswer.__table__
+    for row in rows:
+        session.execute(table.delete().where(
+            table.c.attempt_id == row["attempt_id"], table.c.question_id == row["question_id"]
+        ))
+    session.execute(table.insert(), rows)
+
+def flush(engine) -> int:
+    """Write buffered saves of still-open attempts to DraftAnswer; returns rows written"""
+    global _pending, _flushing
+    with _lock:
+        if not _pending:
+            return 0
+        _flushing, _pending = _pending, {}
+    try:
+        rows = []
+        with Session(engine) as session:
+            open_ids = set(session.exec(
+                select(QuizAttempt.id).where(QuizAttempt.id.in_(list(_flushing)), QuizAttempt.submitted_at == None)
+            ).all())
+            # Submitted on another worker (or by the sweep): stop accepting saves for them here
+            for attempt_id in _flushing:
+                if attempt_id not in open_ids:
+                    open_attempts.invalidate(attempt_id)
+            now = datetime.utcnow()
+            rows = [
+                {"attempt_id": attempt_id, "question_id": question_id, "answer_text": text, "updated_at": now}
+                for attempt_id, answers in _flushing.items() if attempt_id in open_ids
+                for question_id, text in answers.items()
+            ]
+            if rows:
+                _upsert(session, rows)
+                session.commit()
+        metrics.incr("autosave.rows_written", len(rows))
+        return len(rows)
+    except Exception:
+        # Put the batch back under any saves that arrived meanwhile, for the next flush
+        with _lock:
+            for attempt_id, answers in _flushing.items():
+                _pending[attempt_id] = {**answers, **_pending.get(attempt_id, {})}
+        raise
+    finally:
+        with _lock:
+            _flushing = {}
+
+async def run(engine, stop: asyncio.Event):
+    """Flush every AUTOSAVE_FLUSH_SECONDS until stop is set, then once more"""
+    while True:
+        try:
+            await asyncio.wait_for(stop.wait(), AUTOSAVE_FLUSH_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+        try:
+            await asyncio.to_thread(flush, engine)
+        except Exception:
+            logger.exception("Autosave flush failed")
+        if stop.is_set():
+            return
@@ -1,11 +1,10 @@
 import os
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
 from typing import List, Optional
-from jinja2 import Template
 from decouple import config
 
+# smtplib, email.mime and jinja2 are imported where they are used, so importing
+# this module (every worker does, via the password reset router) stays cheap.
+
 # Email Configuration
 SMTP_HOST = config("SMTP_HOST", default="smtp.gmail.com")
 SMTP_PORT = config("SMTP_PORT", default=587, cast=int)
@@ -38,6 +37,10 @@ def send_email(
         print(f"Email not configured. Would have sent to {to_email}: {subject}")
         return False
     
+    import smtplib
+    from email.mime.text import MIMEText
+    from email.mime.multipart import MIMEMultipart
+
     try:
         # Create message
         msg = MIMEMultipart('alternative')
@@ -112,6 +115,7 @@ def send_password_reset_email(to_email: str, reset_token: str, user_name: str) -
     </html>
     """
     
+    from jinja2 import Template
     template = Template(html_template)
     html_body = template.render(user_name=user_name, reset_link=reset_link)
     
@@ -172,6 +176,7 @@ def send_assignment_notification(to_email: str, student_name: str, assignment_ti
     </html>
     """
     
+    from jinja2 import Template
     template = Template(html_template)
     html_body = template.render(
         student_name=student_name,
@@ -0,0 +1,177 @@
+import math
+from datetime import datetime
+from typing import Dict, List, Optional
+from decouple import config
+from sqlalchemy import update
+from sqlmodel import Session, select, func, case, or_
+from models import Assignment, Quiz, QuizAttempt, Submission
+from cache import TTLCache
+
+# Grade distributions per assignment and per quiz: count, mean, standard deviation,
+# min/max, percentiles and a histogram. Everything is aggregated in SQL (GROUP BY
+# for moments and histogram buckets, window ranks for percentiles), so only a few
+# rows per item come back however many students there are. Results are cached per
+# item together with the item's grades_changed_at. Grade writes set that column in
+# their own transaction (see mark_*_graded), so a worker serving the stats endpoint
+# recomputes an item as soon as any worker grades it. A timestamp rather than a
+# counter, so an item that reuses a deleted item's id never matches its entry.
+STATS_CACHE_SIZE = config("STATS_CACHE_SIZE", default=10000, cast=int)
+STATS_CACHE_TTL_SECONDS = config("STATS_CACHE_TTL_SECONDS", default=300, cast=float)
+
+PERCENTILES = (10, 25, 50, 75, 90)
+HISTOGRAM_BINS = 10  # equal-width bins over 0-100% of the item's maximum
+
+stats_cache = TTLCache("grade_stats", maxsize=STATS_CACHE_SIZE, ttl=STATS_CACHE_TTL_SECONDS)
+
+
+def _assignment_values(assignment_ids: List[int]):
+    """Graded submissions: raw points, plus percentage of max points for the histogram"""
+    return (
+        select(
+            Submission.assignment_id.label("item_id"),
+            Submission.grade.label("value"),
+            (Submission.grade * 100.0 / func.nullif(Assignment.max_points, 0)).label("pct"),
+        )
+        .join(Assignment, Assignment.id == Submission.assignment_id)
+        .where(Submission.assignment_id.in_(assignment_ids), Submission.grade != None)
+        .subquery()
+    )
+
+def _quiz_values(quiz_ids: List[int]):
+    """Each student's best submitted attempt, as a percentage"""
+    best = (
+        select(QuizAttempt.quiz_id.label("item_id"), func.max(QuizAttempt.percentage).label("value"))
+        .where(
+            QuizAttempt.quiz_id.in_(quiz_ids),
+            QuizAttempt.submitted_at != None,
+            QuizAttempt.percentage != None,
+        )
+        .group_by(QuizAttempt.quiz_id, QuizAttempt.student_id)
+        .subquery()
+    )
+    return select(best.c.item_id, best.c.value, best.c.value.label("pct")).subquery()
+
+def _empty_stats() -> dict:
+    width = 100 / HISTOGRAM_BINS
+    return {
+        "count": 0, "mean": None, "median": None, "std": None, "min": None, "max": None,
+        "percentiles": {f"p{p}": None for p in PERCENTILES},
+        "histogram": [{"lower": round(i * width, 2), "upper": round((i + 1) * width, 2), "count": 0}
+                      for i in range(HISTOGRAM_BINS)],
+    }
+
+def _compute(session: Session, values, item_ids: List[int]) -> Dict[int, dict]:
+    results = {item_id: _empty_stats() for item_id in item_ids}
+
+    # Moments: population standard deviation from the sum of squares
+    moments = session.exec(
+        select(
+            values.c.item_id, func.count(values.c.value), func.avg(values.c.value),
+            func.min(values.c.value), func.max(values.c.value), func.sum(values.c.value * values.c.value),
+        ).group_by(values.c.item_id)
+    ).all()
+    for item_id, count, mean, low, high, sum_squares in moments:
+        stats = results[item_id]
+        variance = max(float(sum_squares) / count - float(mean) ** 2, 0.0)
+        stats.update(count=count, mean=round(float(mean), 2), std=round(math.sqrt(variance), 2),
+                     min=float(low), max=float(high))
+
+    # Percentiles (linear interpolation): rank the values per item and fetch only
+    # the two ranks around each percentile's position
+    ranked = select(
+        values.c.item_id,
+        values.c.value,
+        func.row_number().over(partition_by=values.c.item_id, order_by=values.c.value).label("row_rank"),
+        func.count().over(partition_by=values.c.item_id).label("n"),
+    ).subquery()
+    def position(p):
+        return (ranked.c.n - 1) * p // 100 + 1
+    ordered = {}
+    for item_id, rank, n, value in session.exec(
+        select(ranked.c.item_id, ranked.c.row_rank, ranked.c.n, ranked.c.value)
+        .where(or_(*[ranked.c.row_rank.between(position(p), position(p) + 1) for p in PERCENTILES]))
+    ).all():
+        ordered.setdefault(item_id, ({}, n))[0][rank] = float(value)
+    for item_id, (by_rank, n) in ordered.items():
+        percentiles = results[item_id]["percentiles"]
+        for p in PERCENTILES:
+            h = (n - 1) * p / 100
+            low_rank = int(h) + 1
+            low = by_rank[low_rank]
+            high = by_rank.get(low_rank + 1, low)
+            percentiles[f"p{p}"] = round(low + (h - int(h)) * (high - low), 2)
+        results[item_id]["median"] = percentiles["p50"]
+
+    # Histogram: out-of-range values fall into the first or last bin
+    width = 100 / HISTOGRAM_BINS
+    bucket = case(
+        *[(values.c.pct < (i + 1) * width, i) for i in range(HISTOGRAM_BINS - 1)],
+        else_=HISTOGRAM_BINS - 1,
+    ).label("bucket")
+    for item_id, bin_index, count in session.exec(
+        select(values.c.item_id, bucket, func.count())
+        .where(values.c.pct != None)
+        .group_by(values.c.item_id, bucket)
+    ).all():
+        results[item_id]["histogram"][bin_index]["count"] = count
+    return results
+
+def _cached(session: Session, kind: str, items: Dict[int, Optional[datetime]], values_for) -> Dict[int, dict]:
+    """Stats per item id; items maps each id to its grades_changed_at"""
+    found = {}
+    for item_id, changed_at in items.items():
+        cached = stats_cache.get((kind, item_id))
+        if cached is not None and cached[0] == changed_at:
+            found[item_id] = cached[1]
+    missing = [item_id for item_id in items if item_id not in found]
+    if missing:
+        for item_id, stats in _compute(session, values_for(missing), missing).items():
+            stats_cache.set((kind, item_id), (items[item_id], stats))
+            found[item_id] = stats
+    return found
+
+def course_stats(session: Session, course_id: int) -> dict:
+    """Distribution statistics for every assignment and quiz of a course.
+
+    Pass a primary session: the result is cached, and a lagging replica read right
+    after a grade write would be cached stale.
+    """
+    # The items (and their grades_changed_at) are read before any statistics, so a
+    # grade written in between only makes the entry outdated on the next read
+    assignments = session.exec(
+        select(Assignment.id, Assignment.title, Assignment.max_points, Assignment.grades_changed_at)
+        .where(Assignment.course_id == course_id)
+        .order_by(Assignment.id)
+    ).all()
+    quizzes = session.exec(
+        select(Quiz.id, Quiz.title, Quiz.grades_changed_at).where(Quiz.course_id == course_id).order_by(Quiz.id)
+    ).all()
+    assignment_stats = _cached(
+        session, "assignment", {a.id: a.grades_changed_at for a in assignments}, _assignment_values
+    )
+    quiz_stats = _cached(session, "quiz", {q.id: q.grades_changed_at for q in quizzes}, _quiz_values)
+    return {
+        "assignments": [
+            {"id": a.id, "title": a.title, "max_points": a.max_points, **assignment_stats[a.id]}
+            for a in assignments
+        ],
+        "quizzes": [{"id": q.id, "title": q.title, "max_points": 100.0, **quiz_stats[q.id]} for q in quizzes],
+    }
+
+def mark_assignment_graded(assignment_id: int):
+    """Statement marking an assignment's cached stats outdated; run it in the grading transaction"""
+    return (
+        update(Assignment)
+        .where(Assignment.id == assignment_id)
+        .values(grades_changed_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+
+def mark_quizzes_graded(quiz_ids: List[int]):
+    """Statement marking quizzes' cached stats outdated; run it in the grading transaction"""
+    return (
+        update(Quiz)
+        .where(Quiz.id.in_(quiz_ids))
+        .values(grades_changed_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
@@ -0,0 +1,113 @@
+import json
+from datetime import datetime
+from typing import Optional
+from sqlmodel import Session, select, func
+from models import Assignment, Course, Enrollment, GradebookEntry, Section, Submission
+
+# GradebookEntry holds one row per (course, student) with the student's grades and
+# totals, so reading a gradebook is a single indexed query. Every write that changes
+# a grade, an assignment or an enrollment updates the affected rows in the same
+# transaction; the caller commits. rebuild() recomputes rows from the source tables.
+
+
+def _percentage(total_points: float, max_points: float) -> float:
+    return round(total_points / max_points * 100, 2) if max_points > 0 else 0
+
+def _apply(entry: GradebookEntry, grades: dict, max_points: float):
+    entry.grades = json.dumps(grades)
+    entry.total_points = float(sum(g for g in grades.values() if g is not None))
+    entry.max_points = max_points
+    entry.percentage = _percentage(entry.total_points, max_points)
+    entry.updated_at = datetime.utcnow()
+
+def course_max_points(session: Session, course_id: int) -> float:
+    return float(session.exec(
+        select(func.coalesce(func.sum(Assignment.max_points), 0)).where(Assignment.course_id == course_id)
+    ).one())
+
+def get_entry(session: Session, course_id: int, student_id: int) -> GradebookEntry:
+    """The student's row for a course, locked for update, created if missing"""
+    entry = session.exec(
+        select(GradebookEntry)
+        .where(GradebookEntry.course_id == course_id, GradebookEntry.student_id == student_id)
+        .with_for_update()
+    ).first()
+    if entry is None:
+        entry = GradebookEntry(course_id=course_id, student_id=student_id)
+        _apply(entry, {}, course_max_points(session, course_id))
+        session.add(entry)
+    return entry
+
+def record_grade(session: Session, course_id: int, student_id: int, assignment_id: int, grade: Optional[float]):
+    """Store a (re)graded submission in the student's gradebook row"""
+    entry = get_entry(session, course_id, student_id)
+    grades = json.loads(entry.grades)
+    grades[str(assignment_id)] = grade
+    _apply(entry, grades, entry.max_points)
+    session.add(entry)
+
+def _adjust_course(session: Session, course_id: int, max_points_delta: float, drop_assignment_id: int = None):
+    entries = session.exec(
+        select(GradebookEntry).where(GradebookEntry.course_id == course_id).with_for_update()
+    ).all()
+    for entry in entries:
+        grades = json.loads(entry.grades)
+        if drop_assignment_id is not None:
+            grades.pop(str(drop_assignment_id), None)
+        _apply(entry, grades, entry.max_points + max_points_delta)
+        session.add(entry)
+
+def assignment_added(session: Session, assignment: Assignment):
+    """Add a new assignment's max points to every row of its course"""
+    _adjust_course(session, assignment.course_id, assignment.max_points)
+
+def assignment_removed(session: Session, assignment: Assignment):
+    """Drop a deleted assignment's grades and max points from every row of its course"""
+    _adjust_course(session, assignment.course_id, -assignment.max_points, drop_assignment_id=assignment.id)
+
+def rebuild_course(session: Session, course_id: int) -> int:
+    """Recompute a course's rows from enrollments and submissions; returns how many changed"""
+    max_points = course_max_points(session, course_id)
+    student_ids = session.exec(
+        select(Enrollment.student_id)
+        .join(Section, Section.id == Enrollment.section_id)
+        .where(Section.course_id == course_id)
+        .distinct()
+    ).all()
+    graded = session.exec(
+        select(Submission.student_id, Submission.assignment_id, Submission.grade)
+        .join(Assignment, Assignment.id == Submission.assignment_id)
+        .where(Assignment.course_id == course_id, Submission.grade != None)
+    ).all()
+    expected = {student_id: {} for student_id in student_ids}
+    for student_id, assignment_id, grade in graded:
+        expected.setdefault(student_id, {})[str(assignment_id)] = grade
+
+    existing = {
+        entry.student_id: entry
+        for entry in session.exec(select(GradebookEntry).where(GradebookEntry.course_id == course_id)).all()
+    }
+    changed = 0
+    for student_id, entry in existing.items():
+        if student_id not in expected:
+            session.delete(entry)
+            changed += 1
+    for student_id, grades in expected.items():
+        entry = existing.get(student_id)
+        if entry is None:
+            entry = GradebookEntry(course_id=course_id, student_id=student_id)
+        else:
+            stored = {k: v for k, v in json.loads(entry.grades).items() if v is not None}
+            if stored == grades and entry.max_points == max_points \
+                    and entry.total_points == float(sum(grades.values())):
+                continue
+        _apply(entry, grades, max_points)
+        session.add(entry)
+        changed += 1
+    session.flush()
+    return changed
+
+def rebuild(session: Session, course_id: Optional[int] = None) -> int:
+    """Repair drift for one course, or all of them"""
+    course_ids = [course_id] if course_id is not None else session.exec(select(Course.id)).all()
+    return sum(rebuild_course(session, cid) for cid in course_ids)
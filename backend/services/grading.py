@@ -0,0 +1,137 @@
+from bisect import bisect_right
+from typing import Dict, List, Optional
+from sqlmodel import Session, select, func, update
+from models import (
+    Assignment, Enrollment, GradeCategory, GradeWeight, GradingScale, Quiz, QuizAttempt, Section, Submission,
+)
+
+# Final course grades: each category (assignments, quizzes) is scored as a
+# percentage, the categories are combined with the course's GradeWeight rows, and
+# the result is mapped to a letter and GPA points through GradingScale.
+# A whole course is computed from a handful of grouped queries, never per student.
+
+# Used when the GradingScale table is empty
+DEFAULT_GRADING_SCALE = [
+    ("A", 90.0, 4.0),
+    ("B", 80.0, 3.0),
+    ("C", 70.0, 2.0),
+    ("D", 60.0, 1.0),
+    ("F", 0.0, 0.0),
+]
+
+
+class LetterScale:
+    """Percentage -> (letter, GPA points) lookup over sorted thresholds"""
+
+    def __init__(self, entries):
+        ordered = sorted(entries, key=lambda e: e[1])
+        self.letters = [letter for letter, _, _ in ordered]
+        self.thresholds = [min_percentage for _, min_percentage, _ in ordered]
+        self.points = [gpa_point for _, _, gpa_point in ordered]
+
+    def lookup(self, percentage: float):
+        i = bisect_right(self.thresholds, percentage) - 1
+        if i < 0:
+            # Below the lowest threshold: use the lowest grade
+            i = 0
+        return self.letters[i], self.points[i]
+
+
+def load_scale(session: Session) -> LetterScale:
+    rows = session.exec(select(GradingScale.grade_letter, GradingScale.min_percentage, GradingScale.gpa_point)).all()
+    return LetterScale(rows or DEFAULT_GRADING_SCALE)
+
+def course_weights(session: Session, course_id: int) -> Dict[GradeCategory, float]:
+    """Configured weights, or equal weights when the course has none"""
+    rows = session.exec(
+        select(GradeWeight.category, GradeWeight.weight).where(GradeWeight.course_id == course_id)
+    ).all()
+    if not rows:
+        return {category: 1.0 for category in GradeCategory}
+    return {GradeCategory(category): weight for category, weight in rows}
+
+def compute_course_grades(session: Session, course_id: int, scale: Optional[LetterScale] = None) -> List[dict]:
+    """Category percentages, weighted percentage, letter and GPA points for every enrolled student"""
+    scale = scale or load_scale(session)
+    weights = course_weights(session, course_id)
+
+    student_ids = session.exec(
+        select(Enrollment.student_id)
+        .join(Section, Section.id == Enrollment.section_id)
+        .where(Section.course_id == course_id)
+        .distinct()
+        .order_by(Enrollment.student_id)
+    ).all()
+
+    # Assignments: points earned over points available (ungraded work counts as 0)
+    assignment_max = session.exec(
+        select(func.coalesce(func.sum(Assignment.max_points), 0)).where(Assignment.course_id == course_id)
+    ).one()
+    earned = dict(session.exec(
+        select(Submission.student_id, func.sum(Submission.grade))
+        .join(Assignment, Assignment.id == Submission.assignment_id)
+        .where(Assignment.course_id == course_id, Submission.grade != None)
+        .group_by(Submission.student_id)
+    ).all())
+
+    # Quizzes: best submitted attempt per quiz, averaged over all quizzes (missing counts as 0)
+    quiz_count = session.exec(select(func.count(Quiz.id)).where(Quiz.course_id == course_id)).one()
+    best_attempts = (
+        select(QuizAttempt.student_id, func.max(QuizAttempt.percentage).label("best"))
+        .join(Quiz, Quiz.id == QuizAttempt.quiz_id)
+        .where(Quiz.course_id == course_id, QuizAttempt.submitted_at != None)
+        .group_by(QuizAttempt.student_id, QuizAttempt.quiz_id)
+        .subquery()
+    )
+    quiz_totals = dict(session.exec(
+        select(best_attempts.c.student_id, func.sum(best_attempts.c.best)).group_by(best_attempts.c.student_id)
+    ).all())
+
+    # Only categories that have work in this course take part in the weighting
+    active = {}
+    if assignment_max > 0:
+        active[GradeCategory.assignment] = weights.get(GradeCategory.assignment, 0.0)
+    if quiz_count > 0:
+        active[GradeCategory.quiz] = weights.get(GradeCategory.quiz, 0.0)
+    total_weight = sum(active.values())
+
+    results = []
+    for student_id in student_ids:
+        categories = {}
+        if GradeCategory.assignment in active:
+            categories[GradeCategory.assignment] = (earned.get(student_id) or 0.0) / assignment_max * 100
+        if GradeCategory.quiz in active:
+            categories[GradeCategory.quiz] = (quiz_totals.get(student_id) or 0.0) / quiz_count
+        if total_weight > 0:
+            percentage = sum(categories[c] * w for c, w in active.items()) / total_weight
+        else:
+            percentage = 0.0
+        letter, gpa_point = scale.lookup(percentage)
+        results.append({
+            "student_id": student_id,
+            "categories": {c.value: round(p, 2) for c, p in categories.items()},
+            "percentage": round(percentage, 2),
+            "letter": letter,
+            "gpa_point": gpa_point,
+        })
+    return results
+
+def finalize_course_grades(session: Session, course_id: int) -> List[dict]:
+    """Compute final grades and write the letters to Enrollment.grade in one bulk UPDATE"""
+    results = compute_course_grades(session, course_id)
+    letters = {r["student_id"]: r["letter"] for r in results}
+    enrollments = session.exec(
+        select(Enrollment.id, Enrollment.student_id)
+        .join(Section, Section.id == Enrollment.section_id)
+        .where(Section.course_id == course_id)
+    ).all()
+    if enrollments:
+        session.execute(
+            update(Enrollment),
+            [{"id": enrollment_id, "grade": letters[student_id]} for enrollment_id, student_id in enrollments],
+        )
+    # Imported here: the transcript service itself builds on this module
+    from services import transcript
+    transcript.bump_version(session)
+    session.commit()
+    return results
@@ -0,0 +1,100 @@
+import json
+from typing import List, Optional
+from decouple import config
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy import func, update
+from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from models import Quiz, Question
+from cache import TTLCache
+from services.quiz_grading import AnswerKey
+
+# Compiled quizzes, cached in process: the quiz row, its questions with parsed
+# options, the student and teacher payloads already serialized to JSON, and the
+# grading key. A class opening an exam together is served from memory.
+# Every edit bumps Quiz.version in the same transaction (bump_version). Readers
+# check the stored version with one primary-key lookup and recompile when it
+# moved, so an edit made on any worker is seen by every worker's next request.
+QUIZ_CACHE_SIZE = config("QUIZ_CACHE_SIZE", default=2000, cast=int)
+QUIZ_CACHE_TTL_SECONDS = config("QUIZ_CACHE_TTL_SECONDS", default=300, cast=float)
+
+quiz_cache = TTLCache("quiz", maxsize=QUIZ_CACHE_SIZE, ttl=QUIZ_CACHE_TTL_SECONDS)
+
+
+def _render(payload: dict) -> bytes:
+    # Same encoding FastAPI applies to a returned dict
+    return JSONResponse(jsonable_encoder(payload)).body
+
+
+class CompiledQuiz:
+    """A quiz and its questions, prepared once for every endpoint that reads them"""
+
+    def __init__(self, quiz: Quiz, questions: List[Question]):
+        self.version = quiz.version or 0
+        self.quiz = quiz.model_dump()
+        teacher_questions, student_questions = [], []
+        for q in questions:
+            q_dict = q.model_dump()
+            if q.options:
+                q_dict["options"] = json.loads(q.options)
+            teacher_questions.append(q_dict)
+            student_questions.append({k: v for k, v in q_dict.items() if k != "correct_answer"})
+        self.questions = {q["id"]: q for q in teacher_questions}
+        self.student_json = _render({**self.quiz, "questions": student_questions})
+        self.teacher_json = _render({**self.quiz, "questions": teacher_questions})
+        self.key = AnswerKey((q.id, q.question_type, q.correct_answer, q.points) for q in questions)
+
+
+def _version_query(quiz_id: int):
+    return select(func.coalesce(Quiz.version, 0)).where(Quiz.id == quiz_id)
+
+def _questions_query(quiz_id: int):
+    return select(Question).where(Question.quiz_id == quiz_id).order_by(Question.order, Question.id)
+
+def _cached(quiz_id: int, version: Optional[int]) -> Optional[CompiledQuiz]:
+    if version is None:
+        quiz_cache.invalidate(quiz_id)
+        return None
+    compiled = quiz_cache.get(quiz_id)
+    return compiled if compiled is not None and compiled.version == version else None
+
+def _store(quiz_id: int, compiled: CompiledQuiz):
+    # A slow compile must not replace a newer one
+    current = quiz_cache.get(quiz_id)
+    if current is None or current.version <= compiled.version:
+        quiz_cache.set(quiz_id, compiled)
+
+def get_compiled(session: Session, quiz_id: int) -> Optional[CompiledQuiz]:
+    """The compiled quiz, or None if it does not exist"""
+    version = session.exec(_version_query(quiz_id)).first()
+    compiled = _cached(quiz_id, version)
+    if compiled is None and version is not None:
+        quiz = session.get(Quiz, quiz_id, populate_existing=True)
+        if not quiz:
+            return None
+        compiled = CompiledQuiz(quiz, session.exec(_questions_query(quiz_id)).all())
+        _store(quiz_id, compiled)
+    return compiled
+
+async def get_compiled_async(session: AsyncSession, quiz_id: int) -> Optional[CompiledQuiz]:
+    version = (await session.exec(_version_query(quiz_id))).first()
+    compiled = _cached(quiz_id, version)
+    if compiled is None and version is not None:
+        quiz = await session.get(Quiz, quiz_id, populate_existing=True)
+        if not quiz:
+            return None
+        compiled = CompiledQuiz(quiz, (await session.exec(_questions_query(quiz_id))).all())
+        _store(quiz_id, compiled)
+    return compiled
+
+def bump_version(session: Session, quiz_id: int):
+    """Mark a quiz as edited; call it in the transaction that makes the edit"""
+    session.execute(
+        update(Quiz).where(Quiz.id == quiz_id).values(version=func.coalesce(Quiz.version, 0) + 1),
+        execution_options={"synchronize_session": False},
+    )
+
+def invalidate(quiz_id: int):
+    """Drop this worker's copy right away (other workers recompile on their next version check)"""
+    quiz_cache.invalidate(quiz_id)
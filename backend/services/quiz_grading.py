@@ -0,0 +1,45 @@
+from typing import Iterable, List, Tuple
+from models import QuestionType
+
+# Quiz auto-grading. The answer key is built once per quiz (and cached with the
+# compiled quiz, see services/quiz_cache.py); grading a submission is a single pass
+# over the key that produces the Answer rows for one bulk INSERT. Grading never
+# touches the session, so one key can grade any number of attempts.
+
+
+class AnswerKey:
+    """Expected answers and points for one quiz"""
+
+    def __init__(self, questions: Iterable[Tuple[int, QuestionType, str, float]]):
+        # (question id, answers dict key, compare case-insensitively, expected answer, points)
+        self.entries = []
+        for question_id, question_type, correct_answer, points in questions:
+            fold_case = question_type == QuestionType.true_false
+            expected = correct_answer.lower() if fold_case else correct_answer
+            self.entries.append((question_id, str(question_id), fold_case, expected, points))
+        self.max_score = float(sum(entry[4] for entry in self.entries))
+
+    def grade(self, attempt_id: int, answers: dict) -> Tuple[List[dict], float]:
+        """Answer rows for every question, and the total score"""
+        rows = []
+        score = 0.0
+        for question_id, key, fold_case, expected, points in self.entries:
+            answer_text = answers.get(key)
+            if answer_text is None:
+                answer_text = ""
+            elif not isinstance(answer_text, str):
+                answer_text = str(answer_text)
+            is_correct = (answer_text.lower() if fold_case else answer_text) == expected
+            points_earned = points if is_correct else 0.0
+            score += points_earned
+            rows.append({
+                "attempt_id": attempt_id,
+                "question_id": question_id,
+                "answer_text": answer_text,
+                "is_correct": is_correct,
+                "points_earned": points_earned,
+            })
+        return rows, score
+
+    def percentage(self, score: float) -> float:
+        return (score / self.max_score * 100) if self.max_score > 0 else 0
@@ -0,0 +1,138 @@
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Optional
+from decouple import config
+from sqlalchemy import insert, update
+from sqlmodel import Session, select
+from models import Answer, Quiz, QuizAttempt
+import metrics
+from services import autosave, grade_stats, quiz_cache
+
+# Server-side quiz timer. An attempt on a timed quiz gets expires_at when it starts.
+# submit_quiz refuses answers that arrive after it (plus a grace period for network
+# latency), and a background sweep closes and grades expired attempts in batches.
+# The sweep polls the (submitted_at, expires_at) index instead of keeping a timer
+# per attempt, so its cost depends on how many attempts expire, not how many are open.
+QUIZ_SUBMIT_GRACE_SECONDS = config("QUIZ_SUBMIT_GRACE_SECONDS", default=30, cast=float)
+QUIZ_AUTOSUBMIT_ENABLED = config("QUIZ_AUTOSUBMIT_ENABLED", default=True, cast=bool)
+QUIZ_AUTOSUBMIT_INTERVAL_SECONDS = config("QUIZ_AUTOSUBMIT_INTERVAL_SECONDS", default=5, cast=float)
+QUIZ_AUTOSUBMIT_BATCH_SIZE = config("QUIZ_AUTOSUBMIT_BATCH_SIZE", default=500, cast=int)
+
+logger = logging.getLogger(__name__)
+
+
+def deadline(time_limit: Optional[int], started_at: datetime) -> Optional[datetime]:
+    """When an attempt started at started_at must be in (time_limit is in minutes)"""
+    return started_at + timedelta(minutes=time_limit) if time_limit else None
+
+def is_late(expires_at: Optional[datetime], now: Optional[datetime] = None) -> bool:
+    if expires_at is None:
+        return False
+    return (now or datetime.utcnow()) > expires_at + timedelta(seconds=QUIZ_SUBMIT_GRACE_SECONDS)
+
+def backfill_deadlines(session: Session) -> int:
+    """Set expires_at on open attempts of timed quizzes that predate the column"""
+    rows = session.exec(
+        select(QuizAttempt.id, QuizAttempt.started_at, Quiz.time_limit)
+        .join(Quiz, Quiz.id == QuizAttempt.quiz_id)
+        .where(QuizAttempt.submitted_at == None, QuizAttempt.expires_at == None, Quiz.time_limit != None)
+    ).all()
+    if rows:
+        session.execute(
+            update(QuizAttempt),
+            [{"id": attempt_id, "expires_at": deadline(time_limit, started_at)}
+             for attempt_id, started_at, time_limit in rows],
+        )
+    return len(rows)
+
+def sweep_delay() -> timedelta:
+    """How long past expires_at an attempt is left before the sweep closes it.
+
+    Autosave accepts saves until the grace period ends, and those may sit in another
+    worker's buffer for up to AUTOSAVE_FLUSH_SECONDS. Waiting two flush intervals
+    more (one for the buffer, one for a slow flush) lets them reach DraftAnswer.
+    """
+    return timedelta(seconds=QUIZ_SUBMIT_GRACE_SECONDS + 2 * autosave.AUTOSAVE_FLUSH_SECONDS)
+
+def auto_submit_expired(session: Session, now: Optional[datetime] = None,
+                        batch_size: int = QUIZ_AUTOSUBMIT_BATCH_SIZE) -> int:
+    """Close and grade one batch of attempts past their deadline; returns how many"""
+    cutoff = (now or datetime.utcnow()) - sweep_delay()
+    due = (
+        select(QuizAttempt.id)
+        .where(QuizAttempt.submitted_at == None, QuizAttempt.expires_at <= cutoff)
+        .order_by(QuizAttempt.expires_at)
+        .limit(batch_size)
+    )
+    # Claim the batch first. Only one writer can flip submitted_at, so a student
+    # submitting at the same moment, or another worker's sweep, cannot also grade
+    # these attempts. Auto-submitted attempts are stamped with their deadline.
+    claimed = session.execute(
+        update(QuizAttempt)
+        .where(QuizAttempt.id.in_(due.scalar_subquery()), QuizAttempt.submitted_at == None)
+        .values(submitted_at=QuizAttempt.expires_at)
+        .returning(QuizAttempt.id, QuizAttempt.quiz_id),
+        execution_options={"synchronize_session": False},
+    ).all()
+    if not claimed:
+        session.rollback()
+        return 0
+
+    attempts_by_quiz = defaultdict(list)
+    for attempt_id, quiz_id in claimed:
+        attempts_by_quiz[quiz_id].append(attempt_id)
+    # Graded from whatever the student autosaved before time ran out
+    attempt_ids = [attempt_id for attempt_id, _ in claimed]
+    drafts = autosave.drafts_for(session, attempt_ids)
+    attempt_rows, answer_rows = [], []
+    for quiz_id, quiz_attempt_ids in attempts_by_quiz.items():
+        compiled = quiz_cache.get_compiled(session, quiz_id)
+        if compiled is None:
+            # Deleted mid-sweep; its attempts are removed with it
+            logger.warning("Quiz %d not found, skipping %d expired attempts", quiz_id, len(quiz_attempt_ids))
+            continue
+        key = compiled.key
+        for attempt_id in quiz_attempt_ids:
+            rows, score = key.grade(attempt_id, drafts.get(attempt_id, {}))
+            answer_rows.extend(rows)
+            attempt_rows.append({
+                "id": attempt_id, "score": score, "max_score": key.max_score, "percentage": key.percentage(score),
+            })
+    if attempt_rows:
+        session.execute(update(QuizAttempt), attempt_rows)
+    if answer_rows:
+        session.execute(insert(Answer), answer_rows)
+    if drafts:
+        session.execute(autosave.delete_drafts(list(drafts)))
+    session.execute(grade_stats.mark_quizzes_graded(list(attempts_by_quiz)))
+    session.commit()
+    autosave.discard(attempt_ids)
+
+    metrics.incr("quiz.auto_submitted", len(claimed))
+    return len(claimed)
+
+def sweep(engine) -> int:
+    """Auto-submit every attempt that is currently past its deadline"""
+    total = 0
+    with Session(engine) as session:
+        while True:
+            closed = auto_submit_expired(session)
+            total += closed
+            if closed < QUIZ_AUTOSUBMIT_BATCH_SIZE:
+                return total
+
+async def run(engine, stop: asyncio.Event):
+    """Sweep every QUIZ_AUTOSUBMIT_INTERVAL_SECONDS until stop is set"""
+    while not stop.is_set():
+        try:
+            closed = await asyncio.to_thread(sweep, engine)
+            if closed:
+                logger.info("Auto-submitted %d expired quiz attempts", closed)
+        except Exception:
+            logger.exception("Quiz auto-submit sweep failed")
+        try:
+            await asyncio.wait_for(stop.wait(), QUIZ_AUTOSUBMIT_INTERVAL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
@@ -0,0 +1,207 @@
+import asyncio
+import hashlib
+import logging
+import math
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+from decouple import config
+from sqlmodel import Session, select, delete
+from sqlmodel.ext.asyncio.session import AsyncSession
+from models import RevokedToken
+import metrics
+
+# Revoked token IDs live in the RevokedToken table. Each worker keeps a bloom
+# filter of them, so the common "not revoked" answer needs no database query.
+# A filter hit is confirmed against the table (false positives are possible).
+REVOCATION_BLOOM_CAPACITY = config("REVOCATION_BLOOM_CAPACITY", default=100000, cast=int)
+REVOCATION_BLOOM_FP_RATE = config("REVOCATION_BLOOM_FP_RATE", default=0.001, cast=float)
+# How often a worker picks up revocations written by other workers
+REVOCATION_SYNC_SECONDS = config("REVOCATION_SYNC_SECONDS", default=15, cast=float)
+# Expired rows are deleted by a background task, off the request path
+REVOCATION_PURGE_SECONDS = config("REVOCATION_PURGE_SECONDS", default=3600, cast=float)
+# Overlap between syncs so rows committed slightly out of order are not missed
+_SYNC_OVERLAP = timedelta(seconds=5)
+
+logger = logging.getLogger(__name__)
+
+
+class BloomFilter:
+    """Fixed-size bloom filter over strings"""
+
+    def __init__(self, capacity: int, fp_rate: float):
+        self.capacity = capacity
+        self.num_bits = max(8, int(-capacity * math.log(fp_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def add(self, item: str):
+        if item in self:
+            return
+        for pos in self._positions(item):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+
+class RevocationStore:
+    """Table-backed set of revoked JWT IDs with an in-memory bloom filter in front"""
+
+    def __init__(self, capacity: int, fp_rate: float, sync_seconds: float):
+        self.capacity = capacity
+        self.fp_rate = fp_rate
+        self.sync_seconds = sync_seconds
+        self._lock = threading.Lock()
+        # One refresh at a time per worker: a thread for sync callers, a task for async ones
+        self._refresh_lock = threading.Lock()
+        self._refresh_lock_async = asyncio.Lock()
+        self._filter = BloomFilter(capacity, fp_rate)
+        self._synced_until: Optional[datetime] = None
+        self._next_sync = 0.0
+
+    def _needs_rebuild(self) -> bool:
+        return self._synced_until is None or self._filter.count >= self._filter.capacity
+
+    def _sync_statement(self):
+        return select(RevokedToken.jti).where(RevokedToken.revoked_at >= self._synced_until - _SYNC_OVERLAP)
+
+    def _load(self, jtis, synced_until: datetime, replace: bool):
+        """Install a freshly built filter (replace) or add newly seen revocations to the current one"""
+        if replace:
+            bloom = BloomFilter(max(self.capacity, len(jtis) * 2), self.fp_rate)
+        with self._lock:
+            if not replace:
+                bloom = self._filter
+            for jti in jtis:
+                bloom.add(jti)
+            self._filter = bloom
+            self._synced_until = synced_until
+            self._next_sync = time.monotonic() + self.sync_seconds
+        metrics.set_gauge("auth.revoked_tokens", bloom.count)
+
+    def _live_statement(self, now: datetime):
+        return select(RevokedToken.jti).where(RevokedToken.expires_at >= now)
+
+    def rebuild(self, session: Session):
+        """Reload the filter from the unexpired rows of the table"""
+        now = datetime.utcnow()
+        self._load(session.exec(self._live_statement(now)).all(), now, replace=True)
+
+    async def rebuild_async(self, session: AsyncSession):
+        now = datetime.utcnow()
+        self._load((await session.exec(self._live_statement(now))).all(), now, replace=True)
+
+    def _sync(self, session: Session):
+        if self._needs_rebuild():
+            self.rebuild(session)
+            return
+        now = datetime.utcnow()
+        self._load(session.exec(self._sync_statement()).all(), now, replace=False)
+
+    async def _sync_async(self, session: AsyncSession):
+        if self._needs_rebuild():
+            await self.rebuild_async(session)
+            return
+        now = datetime.utcnow()
+        self._load((await session.exec(self._sync_statement())).all(), now, replace=False)
+
+    def _claim_refresh(self) -> bool:
+        """Whether this caller should refresh now; pushes the next refresh out so others don't"""
+        if self._synced_until is not None and time.monotonic() < self._next_sync:
+            return False
+        self._next_sync = time.monotonic() + self.sync_seconds
+        return True
+
+    def _due(self) -> bool:
+        return self._synced_until is None or time.monotonic() >= self._next_sync
+
+    def _refresh(self, session: Session):
+        # Before the first load every caller waits for it; afterwards a caller that
+        # finds a refresh in progress keeps using the current filter
+        if not self._refresh_lock.acquire(blocking=self._synced_until is None):
+            return
+        try:
+            if self._claim_refresh():
+                try:
+                    self._sync(session)
+                except Exception:
+                    self._next_sync = 0.0
+                    raise
+        finally:
+            self._refresh_lock.release()
+
+    async def _refresh_async(self, session: AsyncSession):
+        if self._refresh_lock_async.locked() and self._synced_until is not None:
+            return
+        async with self._refresh_lock_async:
+            if self._claim_refresh():
+                try:
+                    await self._sync_async(session)
+                except Exception:
+                    self._next_sync = 0.0
+                    raise
+
+    def purge_expired(self, session: Session) -> int:
+        """Delete rows for tokens that have expired anyway; returns how many"""
+        deleted = session.exec(delete(RevokedToken).where(RevokedToken.expires_at < datetime.utcnow()))
+        session.commit()
+        return deleted.rowcount
+
+    def revoke(self, session: Session, jti: str, expires_at: datetime, user_id: Optional[int] = None):
+        if session.get(RevokedToken, jti) is None:
+            session.add(RevokedToken(jti=jti, user_id=user_id, expires_at=expires_at))
+            session.commit()
+        with self._lock:
+            self._filter.add(jti)
+        metrics.incr("auth.tokens_revoked")
+
+    def is_revoked(self, session: Session, jti: str) -> bool:
+        if self._due():
+            self._refresh(session)
+        if jti not in self._filter:
+            return False
+        metrics.incr("auth.revocation_filter_hits")
+        return session.get(RevokedToken, jti) is not None
+
+    async def is_revoked_async(self, session: AsyncSession, jti: str) -> bool:
+        if self._due():
+            await self._refresh_async(session)
+        if jti not in self._filter:
+            return False
+        metrics.incr("auth.revocation_filter_hits")
+        return (await session.get(RevokedToken, jti)) is not None
+
+
+revocation_store = RevocationStore(
+    REVOCATION_BLOOM_CAPACITY, REVOCATION_BLOOM_FP_RATE, REVOCATION_SYNC_SECONDS
+)
+
+
+def purge(engine) -> int:
+    with Session(engine) as session:
+        return revocation_store.purge_expired(session)
+
+async def run(engine, stop: asyncio.Event):
+    """Purge expired revocations at startup and every REVOCATION_PURGE_SECONDS until stop is set"""
+    while not stop.is_set():
+        try:
+            purged = await asyncio.to_thread(purge, engine)
+            if purged:
+                logger.info("Purged %d expired token revocations", purged)
+        except Exception:
+            logger.exception("Token revocation purge failed")
+        try:
+            await asyncio.wait_for(stop.wait(), REVOCATION_PURGE_SECONDS)
+        except asyncio.TimeoutError:
+            pass
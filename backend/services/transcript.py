@@ -0,0 +1,112 @@
+from typing import Dict, Iterable, List, Optional
+from decouple import config
+from sqlalchemy import update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlmodel import Session, select
+from models import Course, Enrollment, Section, Semester, TranscriptVersion, User
+from cache import TTLCache
+from services.grading import load_scale
+
+# Transcripts (per-semester GPA and cumulative GPA) for any set of students, built
+# from one query over Enrollment.grade, Course.credit_hours and Semester, with the
+# letter -> points mapping taken from GradingScale. Results are cached per student
+# together with the TranscriptVersion they were built at. Writers that change final
+# grades, the grading scale or credit hours bump that version in their own
+# transaction, so every worker sees the change on its next read (one primary-key
+# lookup). Callers pass a primary session: a replica read right after a change
+# would be cached stale.
+TRANSCRIPT_CACHE_SIZE = config("TRANSCRIPT_CACHE_SIZE", default=50000, cast=int)
+TRANSCRIPT_CACHE_TTL_SECONDS = config("TRANSCRIPT_CACHE_TTL_SECONDS", default=600, cast=float)
+
+transcript_cache = TTLCache("transcript", maxsize=TRANSCRIPT_CACHE_SIZE, ttl=TRANSCRIPT_CACHE_TTL_SECONDS)
+
+
+def _gpa(quality_points: float, credits: float) -> Optional[float]:
+    return round(quality_points / credits, 2) if credits else None
+
+def current_version(session: Session) -> int:
+    return session.exec(select(TranscriptVersion.version).where(TranscriptVersion.id == 1)).first() or 0
+
+def bump_version(session: Session):
+    """Mark every cached transcript stale; call it in the transaction that makes the change"""
+    table = TranscriptVersion.__table__
+    dialect = session.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        insert = (postgresql if dialect == "postgresql" else sqlite).insert(table).values(id=1, version=1)
+        session.execute(insert.on_conflict_do_update(index_elements=["id"], set_={"version": table.c.version + 1}))
+        return
+    if not session.execute(update(table).where(table.c.id == 1).values(version=table.c.version + 1)).rowcount:
+        session.execute(table.insert().values(id=1, version=1))
+
+def compute_transcripts(session: Session, student_ids: Iterable[int], version: Optional[int] = None) -> Dict[int, dict]:
+    """Build transcripts for the given students in one pass and cache them"""
+    student_ids = list(student_ids)
+    if not student_ids:
+        return {}
+    # Read before the data: if a change lands in between, the entry is just recomputed next time
+    if version is None:
+        version = current_version(session)
+    scale = load_scale(session)
+    points_for = dict(zip(scale.letters, scale.points))
+
+    names = dict(session.exec(select(User.id, User.full_name).where(User.id.in_(student_ids))).all())
+    rows = session.exec(
+        select(
+            Enrollment.student_id, Semester.id, Semester.name,
+            Course.id, Course.code, Course.title, Course.credit_hours, Enrollment.grade,
+        )
+        .join(Section, Section.id == Enrollment.section_id)
+        .join(Course, Course.id == Section.course_id)
+        .join(Semester, Semester.id == Section.semester_id)
+        .where(Enrollment.student_id.in_(student_ids), Enrollment.grade != None)
+        .order_by(Enrollment.student_id, Semester.id, Course.code)
+    ).all()
+
+    transcripts = {
+        student_id: {"student_id": student_id, "student_name": names.get(student_id), "semesters": [],
+                     "total_credits": 0, "cgpa": None}
+        for student_id in student_ids
+    }
+    # Rows arrive grouped by student, then semester
+    running = {}  # student_id -> [quality points, credits] across semesters so far
+    for student_id, semester_id, semester_name, course_id, code, title, credit_hours, grade in rows:
+        transcript = transcripts[student_id]
+        semesters = transcript["semesters"]
+        if not semesters or semesters[-1]["semester_id"] != semester_id:
+            semesters.append({"semester_id": semester_id, "semester_name": semester_name, "courses": [],
+                              "credits": 0, "quality_points": 0.0, "gpa": None, "cgpa": None})
+        semester = semesters[-1]
+        gpa_point = points_for.get(grade)
+        semester["courses"].append({"course_id": course_id, "code": code, "title": title,
+                                    "credit_hours": credit_hours, "grade": grade, "gpa_point": gpa_point})
+        # Letters outside the grading scale (e.g. incomplete) carry no GPA weight
+        if gpa_point is not None:
+            semester["credits"] += credit_hours
+            semester["quality_points"] += gpa_point * credit_hours
+            totals = running.setdefault(student_id, [0.0, 0])
+            totals[0] += gpa_point * credit_hours
+            totals[1] += credit_hours
+        semester["gpa"] = _gpa(semester["quality_points"], semester["credits"])
+        totals = running.get(student_id, [0.0, 0])
+        semester["cgpa"] = _gpa(totals[0], totals[1])
+
+    for student_id, transcript in transcripts.items():
+        quality_points, credits = running.get(student_id, [0.0, 0])
+        transcript["total_credits"] = credits
+        transcript["cgpa"] = _gpa(quality_points, credits)
+        for semester in transcript["semesters"]:
+            del semester["quality_points"]
+        transcript_cache.set(student_id, (version, transcript))
+    return transcripts
+
+def get_transcripts(session: Session, student_ids: List[int]) -> List[dict]:
+    """Cached transcripts, computing missing or outdated ones together; keeps the given order"""
+    version = current_version(session)
+    found = {}
+    for student_id in student_ids:
+        cached = transcript_cache.get(student_id)
+        if cached is not None and cached[0] == version:
+            found[student_id] = cached[1]
+    missing = [student_id for student_id in student_ids if student_id not in found]
+    found.update(compute_transcripts(session, missing, version))
+    return [found[student_id] for student_id in student_ids]
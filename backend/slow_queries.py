@@ -0,0 +1,122 @@
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+from decouple import config
+import metrics
+
+# Statements slower than this are logged together with their query plan
+SLOW_QUERY_SECONDS = config("SLOW_QUERY_SECONDS", default=0.2, cast=float)
+SLOW_QUERY_LOG_PATH = config("SLOW_QUERY_LOG_PATH", default="logs/slow_queries.log")
+SLOW_QUERY_LOG_MAX_BYTES = config("SLOW_QUERY_LOG_MAX_BYTES", default=5 * 1024 * 1024, cast=int)
+SLOW_QUERY_LOG_BACKUPS = config("SLOW_QUERY_LOG_BACKUPS", default=3, cast=int)
+# EXPLAIN ANALYZE runs the statement a second time, so it is opt-in (Postgres only)
+SLOW_QUERY_EXPLAIN_ANALYZE = config("SLOW_QUERY_EXPLAIN_ANALYZE", default=False, cast=bool)
+# Distinct statements kept for the top-offenders report
+SLOW_QUERY_MAX_TRACKED = config("SLOW_QUERY_MAX_TRACKED", default=500, cast=int)
+
+_lock = threading.Lock()
+_offenders = {}
+_logger = None
+
+def _get_logger() -> logging.Logger:
+    """JSON lines logger on a rotating file, created on first use"""
+    global _logger
+    if _logger is None:
+        log_dir = os.path.dirname(SLOW_QUERY_LOG_PATH)
+        if log_dir:
+            os.makedirs(log_dir, exist_ok=True)
+        logger = logging.getLogger("slow_queries")
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        handler = RotatingFileHandler(
+            SLOW_QUERY_LOG_PATH, maxBytes=SLOW_QUERY_LOG_MAX_BYTES, backupCount=SLOW_QUERY_LOG_BACKUPS
+        )
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        _logger = logger
+    return _logger
+
+def parameter_shape(parameters, executemany: bool = False):
+    """Types of the bound parameters without their values"""
+    if executemany:
+        batch = list(parameters or [])
+        return {"rows": len(batch), "row": parameter_shape(batch[0]) if batch else None}
+    if isinstance(parameters, dict):
+        return {key: type(value).__name__ for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [type(value).__name__ for value in parameters]
+    return type(parameters).__name__
+
+def explain(conn, statement: str, parameters, executemany: bool = False) -> str:
+    """Query plan for a SELECT, run on the connection that executed it"""
+    if executemany or not statement.lstrip().upper().startswith(("SELECT", "WITH")):
+        return None
+    dialect = conn.dialect.name
+    if dialect == "sqlite":
+        prefix = "EXPLAIN QUERY PLAN "
+    elif dialect == "postgresql":
+        prefix = "EXPLAIN ANALYZE " if SLOW_QUERY_EXPLAIN_ANALYZE else "EXPLAIN "
+    else:
+        return None
+    # On Postgres a failed statement aborts the transaction, so EXPLAIN runs inside a savepoint
+    savepoint = dialect == "postgresql"
+    cursor = conn.connection.cursor()
+    try:
+        if savepoint:
+            cursor.execute("SAVEPOINT slow_query_explain")
+        cursor.execute(prefix + statement, parameters)
+        rows = cursor.fetchall()
+        if savepoint:
+            cursor.execute("RELEASE SAVEPOINT slow_query_explain")
+    except Exception as exc:
+        if savepoint:
+            cursor.execute("ROLLBACK TO SAVEPOINT slow_query_explain")
+        return f"EXPLAIN failed: {exc}"
+    finally:
+        cursor.close()
+    # SQLite returns (id, parent, notused, detail); Postgres returns one text column
+    return "\n".join(str(row[-1]) for row in rows)
+
+def capture(conn, statement: str, parameters, executemany: bool, seconds: float, route: str = None):
+    """Record a statement that crossed SLOW_QUERY_SECONDS"""
+    plan = explain(conn, statement, parameters, executemany)
+    entry = {
+        "at": datetime.utcnow().isoformat(),
+        "seconds": round(seconds, 4),
+        "route": route,
+        "statement": statement,
+        "parameters": parameter_shape(parameters, executemany),
+        "plan": plan,
+    }
+    metrics.incr("db.slow_queries")
+    _get_logger().info(json.dumps(entry, default=str))
+
+    with _lock:
+        offender = _offenders.get(statement)
+        if offender is None:
+            if len(_offenders) >= SLOW_QUERY_MAX_TRACKED:
+                # Make room by dropping the statement with the least total time
+                del _offenders[min(_offenders, key=lambda s: _offenders[s]["total_seconds"])]
+            offender = _offenders[statement] = {
+                "statement": statement, "count": 0, "total_seconds": 0.0, "max_seconds": 0.0, "routes": set(),
+            }
+        offender["count"] += 1
+        offender["total_seconds"] += seconds
+        offender["max_seconds"] = max(offender["max_seconds"], seconds)
+        if route:
+            offender["routes"].add(route)
+        offender["last_plan"] = plan
+        offender["last_parameters"] = entry["parameters"]
+        offender["last_seen"] = entry["at"]
+
+def top_offenders(limit: int = 20) -> list:
+    """Slow statements seen by this worker, by total time spent"""
+    with _lock:
+        ranked = sorted(_offenders.values(), key=lambda o: o["total_seconds"], reverse=True)[:limit]
+        return [
+            {**o, "routes": sorted(o["routes"]), "avg_seconds": o["total_seconds"] / o["count"]}
+            for o in ranked
+        ]
@@ -0,0 +1,76 @@
+# Verify read-replica routing using two local SQLite files as primary and replica.
+# Each file gets a marker row, so every read shows which database served it.
+# Usage: python verify_replica_routing.py
+
+import os
+import tempfile
+import time
+
+tmp_dir = tempfile.mkdtemp(prefix="lms_replica_")
+os.environ["DATABASE_URL"] = f"sqlite:///{tmp_dir}/primary.db"
+os.environ["DATABASE_REPLICA_URL"] = f"sqlite:///{tmp_dir}/replica.db"
+os.environ["REPLICA_MAX_LAG_SECONDS"] = "1"
+
+from starlette.requests import Request
+from starlette.responses import Response
+from sqlmodel import SQLModel, Session, select
+import database
+from models import Semester
+
+def make_request(method: str, token: str = None, extra_headers: dict = None) -> Request:
+    headers = [(b"authorization", f"Bearer {token}".encode())] if token else []
+    headers += [(name.lower().encode(), value.encode()) for name, value in (extra_headers or {}).items()]
+    return Request({"type": "http", "method": method, "path": "/", "headers": headers, "client": ("127.0.0.1", 5000)})
+
+def served_by(request: Request) -> str:
+    sessions = database.get_routed_session(request)
+    session = next(sessions)
+    try:
+        return session.exec(select(Semester.name)).first()
+    finally:
+        sessions.close()
+
+def check(label: str, actual: str, expected: str) -> bool:
+    status = "✅" if actual == expected else "❌"
+    print(f"{status} {label}: served by {actual} (expected {expected})")
+    return actual == expected
+
+def verify_replica_routing():
+    for name, target in (("primary", database.engine), ("replica", database.replica_engine)):
+        SQLModel.metadata.create_all(target)
+        with Session(target) as session:
+            session.add(Semester(name=name))
+            session.commit()
+
+    results = [
+        check("Anonymous GET", served_by(make_request("GET")), "replica"),
+        check("POST", served_by(make_request("POST", "alice")), "primary"),
+    ]
+
+    database.note_write(make_request("POST", "alice"))
+    results.append(check("GET right after own write", served_by(make_request("GET", "alice")), "primary"))
+    results.append(check("GET by another user", served_by(make_request("GET", "bob")), "replica"))
+
+    # The write was handled by another worker: only its response marker reaches this one
+    response = Response()
+    database.note_write(make_request("POST", "carol"), response)
+    database._recent_writers.clear()
+    until = response.headers[database.READ_PRIMARY_HEADER]
+    results.append(check("GET after a write on another worker (header)",
+                         served_by(make_request("GET", "carol", {database.READ_PRIMARY_HEADER: until})), "primary"))
+    results.append(check("GET after a write on another worker (cookie)",
+                         served_by(make_request("GET", "carol", {"cookie": f"{database.READ_PRIMARY_COOKIE}={until}"})), "primary"))
+    results.append(check("GET with a marker too far ahead",
+                         served_by(make_request("GET", "carol", {database.READ_PRIMARY_HEADER: str(time.time() + 3600)})), "replica"))
+
+    time.sleep(database.REPLICA_MAX_LAG_SECONDS + 0.1)
+    results.append(check("GET after lag window", served_by(make_request("GET", "alice")), "replica"))
+
+    # Pretend the replica fell behind
+    database._replica_health.update(lag=database.REPLICA_MAX_LAG_SECONDS + 10, checked_at=time.monotonic())
+    results.append(check("GET while replica lags", served_by(make_request("GET", "bob")), "primary"))
+
+    print("\nAll checks passed" if all(results) else "\nSome checks FAILED")
+
+if __name__ == "__main__":
+    verify_replica_routing()
@@ -1,4 +1,5 @@
 import { createContext, useContext, useState, type ReactNode } from 'react';
+import api from '../services/api';
 
 interface User {
     id: number;
@@ -34,6 +35,12 @@ export const AuthProvider = ({ children }: { children: ReactNode }) => {
     };
 
     const logout = () => {
+        const refreshToken = localStorage.getItem('refresh_token');
+        if (localStorage.getItem('token')) {
+            // Revoke server-side; local state is cleared regardless of the outcome
+            api.post('/auth/logout', { refresh_token: refreshToken }).catch(() => {});
+        }
+        localStorage.removeItem('refresh_token');
         setToken(null);
         setUser(null);
         localStorage.removeItem('token');
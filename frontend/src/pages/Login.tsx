@@ -16,6 +16,7 @@ const Login = () => {
     useEffect(() => {
         // Clear tokens on mount to ensure clean login state
         localStorage.removeItem('token');
+        localStorage.removeItem('refresh_token');
         localStorage.removeItem('user');
     }, []);
 
@@ -33,7 +34,8 @@ const Login = () => {
                 headers: { 'Content-Type': 'application/x-www-form-urlencoded' }
             });
 
-            const { access_token } = response.data;
+            const { access_token, refresh_token } = response.data;
+            localStorage.setItem('refresh_token', refresh_token);
 
             // Get user profile
             const userResponse = await api.get('/auth/me', {
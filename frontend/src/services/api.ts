@@ -4,12 +4,21 @@ const api = axios.create({
     baseURL: 'http://localhost:8000',
 });
 
+const READ_PRIMARY_HEADER = 'X-Read-Primary-Until';
+const READ_PRIMARY_KEY = 'read_primary_until';
+
 api.interceptors.request.use(
     (config) => {
         const token = localStorage.getItem('token');
         if (token && !config.headers.Authorization) {
             config.headers.Authorization = `Bearer ${token}`;
         }
+        // After a write, the API asks for reads from the primary database for a few
+        // seconds so a lagging replica doesn't hide it; echo that back to any server
+        const readPrimaryUntil = Number(localStorage.getItem(READ_PRIMARY_KEY));
+        if (readPrimaryUntil > Date.now() / 1000) {
+            config.headers[READ_PRIMARY_HEADER] = String(readPrimaryUntil);
+        }
         return config;
     },
     (error) => {
@@ -17,4 +26,63 @@ api.interceptors.request.use(
     }
 );
 
+// Access tokens are short-lived: on a 401, trade the refresh token for a new
+// pair once and replay the request.
+let refreshing: Promise<string> | null = null;
+
+const refreshAccessToken = async (): Promise<string> => {
+    const refreshToken = localStorage.getItem('refresh_token');
+    if (!refreshToken) {
+        throw new Error('No refresh token');
+    }
+    let response;
+    try {
+        response = await axios.post(`${api.defaults.baseURL}/auth/refresh`, {
+            refresh_token: refreshToken,
+        });
+    } catch (err) {
+        // Refresh tokens rotate: if another tab refreshed meanwhile, ours was already
+        // used up and the pair it stored is the one to keep
+        const current = localStorage.getItem('refresh_token');
+        const token = localStorage.getItem('token');
+        if (current && current !== refreshToken && token) {
+            return token;
+        }
+        if (current === refreshToken) {
+            localStorage.removeItem('refresh_token');
+        }
+        throw err;
+    }
+    localStorage.setItem('token', response.data.access_token);
+    localStorage.setItem('refresh_token', response.data.refresh_token);
+    return response.data.access_token;
+};
+
+api.interceptors.response.use(
+    (response) => {
+        const readPrimaryUntil = response.headers[READ_PRIMARY_HEADER.toLowerCase()];
+        if (readPrimaryUntil) {
+            localStorage.setItem(READ_PRIMARY_KEY, readPrimaryUntil);
+        }
+        return response;
+    },
+    async (error) => {
+        const original = error.config;
+        if (error.response?.status !== 401 || !original || original._retry || original.url?.startsWith('/auth/')) {
+            return Promise.reject(error);
+        }
+        original._retry = true;
+        try {
+            refreshing = refreshing ?? refreshAccessToken();
+            const token = await refreshing;
+            original.headers.Authorization = `Bearer ${token}`;
+            return api(original);
+        } catch {
+            return Promise.reject(error);
+        } finally {
+            refreshing = null;
+        }
+    }
+);
+
 export default api;